@@ -8,15 +8,59 @@ import json
 import random
 import time
 import boto3
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from botocore.config import Config
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional
 import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+# PutRecords accepts at most 500 records and 5 MiB per request
+KINESIS_MAX_RECORDS = 500
+KINESIS_MAX_BYTES = 5 * 1024 * 1024
+KINESIS_MAX_ATTEMPTS = 5
+
+# Enough pooled connections for the concurrent senders, TCP keep-alive so they
+# stay warm, and adaptive retries to back off on throughput exceptions
+KINESIS_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={'max_attempts': 10, 'mode': 'adaptive'}
+)
+
+def prefixed_ids(prefix: str, numbers: np.ndarray) -> List[str]:
+    """Format an array of numbers as prefixed ID strings in one vectorized pass"""
+    return np.char.add(prefix, numbers.astype(str)).tolist()
+
+if orjson:
+    encode_event = orjson.dumps
+else:
+    def encode_event(event: Dict[str, Any]) -> bytes:
+        """Encode an event as JSON bytes"""
+        return json.dumps(event).encode()
+
 class SampleDataGenerator:
-    def __init__(self, stream_name: str, region: str = 'us-east-1'):
+    def __init__(self, stream_name: str, region: str = 'us-east-1', num_shards: Optional[int] = None,
+                 seed: Optional[int] = None):
         self.stream_name = stream_name
-        self.kinesis_client = boto3.client('kinesis', region_name=region)
+        self.kinesis_client = boto3.client('kinesis', region_name=region, config=KINESIS_CONFIG)
+        
+        # Random generators owned by this instance; a seed makes runs reproducible
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        
+        # Explicit hash keys at the middle of each shard's range of the 128-bit
+        # hash key space, so records can be spread evenly across the shards
+        self.shard_hash_keys = [
+            str((2 * shard + 1) * 2 ** 127 // num_shards) for shard in range(num_shards)
+        ] if num_shards else []
         
         # Sample data templates
         self.event_types = ['view', 'click', 'purchase', 'signup', 'login', 'logout', 'add_to_cart', 'remove_from_cart']
@@ -31,155 +75,256 @@ class SampleDataGenerator:
     
     def _generate_user_base(self, count: int) -> List[Dict[str, Any]]:
         """Generate a base set of users for consistent data generation"""
+        choices = self.random.choices
         users = []
-        for i in range(count):
+        for i, age, income, location, is_premium in zip(
+            range(count),
+            choices(range(18, 81), k=count),
+            choices(range(20000, 200001), k=count),
+            choices(['US', 'CA', 'UK', 'DE', 'FR', 'AU', 'JP'], k=count),
+            choices([True, False], k=count)
+        ):
             user = {
                 'user_id': f'user_{i:06d}',
-                'age': random.randint(18, 80),
-                'income': random.randint(20000, 200000),
-                'location': random.choice(['US', 'CA', 'UK', 'DE', 'FR', 'AU', 'JP']),
-                'signup_date': datetime.now() - timedelta(days=random.randint(1, 365)),
-                'is_premium': random.choice([True, False]),
-                'preferred_category': random.choice(self.product_categories)
+                'age': age,
+                'income': income,
+                'location': location,
+                'is_premium': is_premium
             }
             users.append(user)
         return users
     
-    def _generate_event(self, user: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate a single event for a user"""
-        event_type = random.choice(self.event_types)
-        timestamp = datetime.now() - timedelta(minutes=random.randint(0, 60))
-        
-        # Base event structure
-        event = {
-            'timestamp': timestamp.isoformat() + 'Z',
-            'user_id': user['user_id'],
-            'event_type': event_type,
-            'session_id': f'session_{random.randint(100000, 999999)}',
-            'device_type': random.choice(self.device_types),
-            'browser': random.choice(self.browsers),
-            'operating_system': random.choice(self.operating_systems),
-            'location': user['location'],
-            'user_age': user['age'],
-            'user_income': user['income'],
-            'is_premium_user': user['is_premium']
-        }
-        
-        # Event-specific data
-        if event_type == 'view':
-            event.update({
-                'product_id': f'prod_{random.randint(1000, 9999)}',
-                'product_category': random.choice(self.product_categories),
-                'page_url': f'/products/{random.randint(1000, 9999)}',
-                'time_on_page': random.randint(10, 300)
-            })
+    def _generate_events_batch(self, n: int) -> List[Dict[str, Any]]:
+        """Generate a batch of events, sampling every field as a NumPy array"""
+        rng = self.rng
+        now = np.datetime64(datetime.now(), 'us')
         
-        elif event_type == 'click':
-            event.update({
-                'click_target': random.choice(['button', 'link', 'image', 'ad']),
-                'click_position': {'x': random.randint(0, 1920), 'y': random.randint(0, 1080)},
-                'page_url': f'/products/{random.randint(1000, 9999)}'
-            })
+        # Fields shared by every event type
+        users = [self.users[i] for i in rng.integers(0, len(self.users), size=n).tolist()]
+        event_types = rng.choice(self.event_types, size=n)
+        seconds_ago = rng.integers(0, 3601, size=n).astype('timedelta64[s]')
+        timestamps = np.char.add(np.datetime_as_string(now - seconds_ago, unit='us'), 'Z').tolist()
+        session_ids = prefixed_ids('session_', rng.integers(100000, 1000000, size=n))
+        device_types = rng.choice(self.device_types, size=n).tolist()
+        browsers = rng.choice(self.browsers, size=n).tolist()
+        operating_systems = rng.choice(self.operating_systems, size=n).tolist()
         
-        elif event_type == 'purchase':
-            event.update({
-                'product_id': f'prod_{random.randint(1000, 9999)}',
-                'product_category': random.choice(self.product_categories),
-                'value': round(random.uniform(10, 1000), 2),
-                'quantity': random.randint(1, 5),
-                'payment_method': random.choice(['credit_card', 'debit_card', 'paypal', 'apple_pay']),
-                'discount_applied': random.choice([True, False]),
-                'discount_amount': round(random.uniform(0, 50), 2) if random.choice([True, False]) else 0
-            })
+        # Event-specific data, sampled only for the slots of each event type
+        details = [{} for _ in range(n)]
         
-        elif event_type == 'add_to_cart':
-            event.update({
-                'product_id': f'prod_{random.randint(1000, 9999)}',
-                'product_category': random.choice(self.product_categories),
-                'value': round(random.uniform(5, 500), 2),
-                'quantity': random.randint(1, 3)
-            })
+        idx = np.flatnonzero(event_types == 'view')
+        k = len(idx)
+        for i, product, category, page, seconds in zip(
+            idx.tolist(),
+            prefixed_ids('prod_', rng.integers(1000, 10000, size=k)),
+            rng.choice(self.product_categories, size=k).tolist(),
+            prefixed_ids('/products/', rng.integers(1000, 10000, size=k)),
+            rng.integers(10, 301, size=k).tolist()
+        ):
+            details[i] = {
+                'product_id': product,
+                'product_category': category,
+                'page_url': page,
+                'time_on_page': seconds
+            }
         
-        elif event_type == 'signup':
-            event.update({
-                'signup_method': random.choice(['email', 'social_media', 'referral']),
-                'newsletter_subscription': random.choice([True, False])
-            })
+        idx = np.flatnonzero(event_types == 'click')
+        k = len(idx)
+        for i, target, x, y, page in zip(
+            idx.tolist(),
+            rng.choice(['button', 'link', 'image', 'ad'], size=k).tolist(),
+            rng.integers(0, 1921, size=k).tolist(),
+            rng.integers(0, 1081, size=k).tolist(),
+            prefixed_ids('/products/', rng.integers(1000, 10000, size=k))
+        ):
+            details[i] = {
+                'click_target': target,
+                'click_position': {'x': x, 'y': y},
+                'page_url': page
+            }
+        
+        idx = np.flatnonzero(event_types == 'purchase')
+        k = len(idx)
+        discount_amounts = np.where(rng.random(k) < 0.5, np.round(rng.uniform(0, 50, size=k), 2), 0)
+        for i, product, category, value, quantity, method, discounted, discount in zip(
+            idx.tolist(),
+            prefixed_ids('prod_', rng.integers(1000, 10000, size=k)),
+            rng.choice(self.product_categories, size=k).tolist(),
+            np.round(rng.uniform(10, 1000, size=k), 2).tolist(),
+            rng.integers(1, 6, size=k).tolist(),
+            rng.choice(['credit_card', 'debit_card', 'paypal', 'apple_pay'], size=k).tolist(),
+            (rng.random(k) < 0.5).tolist(),
+            discount_amounts.tolist()
+        ):
+            details[i] = {
+                'product_id': product,
+                'product_category': category,
+                'value': value,
+                'quantity': quantity,
+                'payment_method': method,
+                'discount_applied': discounted,
+                'discount_amount': discount
+            }
+        
+        idx = np.flatnonzero(event_types == 'add_to_cart')
+        k = len(idx)
+        for i, product, category, value, quantity in zip(
+            idx.tolist(),
+            prefixed_ids('prod_', rng.integers(1000, 10000, size=k)),
+            rng.choice(self.product_categories, size=k).tolist(),
+            np.round(rng.uniform(5, 500, size=k), 2).tolist(),
+            rng.integers(1, 4, size=k).tolist()
+        ):
+            details[i] = {
+                'product_id': product,
+                'product_category': category,
+                'value': value,
+                'quantity': quantity
+            }
+        
+        idx = np.flatnonzero(event_types == 'signup')
+        k = len(idx)
+        for i, method, newsletter in zip(
+            idx.tolist(),
+            rng.choice(['email', 'social_media', 'referral'], size=k).tolist(),
+            (rng.random(k) < 0.5).tolist()
+        ):
+            details[i] = {
+                'signup_method': method,
+                'newsletter_subscription': newsletter
+            }
         
-        elif event_type == 'login':
+        idx = np.flatnonzero(event_types == 'login')
+        k = len(idx)
+        for i, method in zip(
+            idx.tolist(),
+            rng.choice(['email', 'social_media', 'sso'], size=k).tolist()
+        ):
+            details[i] = {'login_method': method}
+        
+        # Session and user behavior data
+        session_durations = rng.integers(60, 3601, size=n).tolist()
+        page_views = rng.integers(1, 21, size=n).tolist()
+        times_on_site = rng.integers(60, 3601, size=n).tolist()
+        bounce_rates = rng.random(n).tolist()
+        previous_purchases = (rng.random(n) < 0.5).tolist()
+        days_since_last_visit = rng.integers(0, 31, size=n).tolist()
+        
+        events = []
+        for (user, event_type, timestamp, session_id, device_type, browser, operating_system, detail,
+             session_duration, views, time_on_site, bounce_rate, previous_purchase, days) in zip(
+            users, event_types.tolist(), timestamps, session_ids, device_types, browsers,
+            operating_systems, details, session_durations, page_views, times_on_site, bounce_rates,
+            previous_purchases, days_since_last_visit
+        ):
+            event = {
+                'timestamp': timestamp,
+                'user_id': user['user_id'],
+                'event_type': event_type,
+                'session_id': session_id,
+                'device_type': device_type,
+                'browser': browser,
+                'operating_system': operating_system,
+                'location': user['location'],
+                'user_age': user['age'],
+                'user_income': user['income'],
+                'is_premium_user': user['is_premium']
+            }
+            event.update(detail)
             event.update({
-                'login_method': random.choice(['email', 'social_media', 'sso']),
-                'session_duration': random.randint(300, 3600)
+                'session_duration': session_duration,
+                'page_views': views,
+                'time_on_site': time_on_site,
+                'bounce_rate': bounce_rate,
+                'has_previous_purchase': previous_purchase,
+                'days_since_last_visit': days
             })
+            events.append(event)
         
-        # Add session and user behavior data
-        event.update({
-            'session_duration': random.randint(60, 3600),
-            'page_views': random.randint(1, 20),
-            'time_on_site': random.randint(60, 3600),
-            'bounce_rate': random.uniform(0, 1),
-            'has_previous_purchase': random.choice([True, False]),
-            'days_since_last_visit': random.randint(0, 30)
-        })
-        
-        return event
+        return events
     
     def _send_to_kinesis(self, events: List[Dict[str, Any]]) -> None:
         """Send events to Kinesis stream"""
         try:
-            records = []
-            for event in events:
-                record = {
-                    'Data': json.dumps(event),
-                    'PartitionKey': event['user_id']
-                }
-                records.append(record)
+            records = [
+                {'Data': encode_event(event), 'PartitionKey': event['user_id']}
+                for event in events
+            ]
             
-            # Send records in batches
+            # Round-robin records over the shards instead of hashing the user ID
+            if self.shard_hash_keys:
+                for record, hash_key in zip(records, itertools.cycle(self.shard_hash_keys)):
+                    record['ExplicitHashKey'] = hash_key
+            
+            # Send records in batches that fit the PutRecords limits
+            for batch in self._chunk_records(records):
+                self._put_records(batch)
+            
+        except Exception as e:
+            print(f"Error sending to Kinesis: {str(e)}")
+            raise
+    
+    def _chunk_records(self, records: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Split records into batches of at most 500 records and 5 MiB"""
+        batch = []
+        batch_bytes = 0
+        for record in records:
+            record_bytes = len(record['Data']) + len(record['PartitionKey'])
+            if batch and (len(batch) == KINESIS_MAX_RECORDS or batch_bytes + record_bytes > KINESIS_MAX_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(record)
+            batch_bytes += record_bytes
+        if batch:
+            yield batch
+    
+    def _put_records(self, records: List[Dict[str, Any]]) -> None:
+        """Put one batch of records, retrying failed records with exponential backoff"""
+        for attempt in range(KINESIS_MAX_ATTEMPTS):
             response = self.kinesis_client.put_records(
                 StreamName=self.stream_name,
                 Records=records
             )
             
-            # Check for failed records
-            failed_count = response['FailedRecordCount']
-            if failed_count > 0:
-                print(f"Warning: {failed_count} records failed to send")
-                for i, record in enumerate(response['Records']):
-                    if 'ErrorCode' in record:
-                        print(f"Record {i} failed: {record['ErrorCode']} - {record['ErrorMessage']}")
+            # Keep only the records that failed
+            if response['FailedRecordCount'] == 0:
+                return
+            failed = [
+                (record, result) for record, result in zip(records, response['Records'])
+                if 'ErrorCode' in result
+            ]
+            records = [record for record, _ in failed]
             
-        except Exception as e:
-            print(f"Error sending to Kinesis: {str(e)}")
-            raise
+            if attempt < KINESIS_MAX_ATTEMPTS - 1:
+                time.sleep(0.1 * 2 ** attempt)
+        
+        print(f"Warning: {len(records)} records failed to send after {KINESIS_MAX_ATTEMPTS} attempts")
+        for record, result in failed:
+            print(f"Record for {record['PartitionKey']} failed: {result['ErrorCode']} - {result['ErrorMessage']}")
     
-    def generate_data(self, num_events: int, batch_size: int = 10) -> None:
-        """Generate and send sample data"""
-        print(f"Generating {num_events} events in batches of {batch_size}")
+    def generate_data(self, num_events: int, batch_size: int = KINESIS_MAX_RECORDS, workers: int = 1) -> None:
+        """Generate and send sample data, sending up to `workers` batches concurrently"""
+        print(f"Generating {num_events} events in batches of {batch_size} with {workers} workers")
         
         events_sent = 0
         batch_count = 0
         
-        while events_sent < num_events:
-            # Generate batch of events
-            batch_events = []
-            batch_size_actual = min(batch_size, num_events - events_sent)
-            
-            for _ in range(batch_size_actual):
-                user = random.choice(self.users)
-                event = self._generate_event(user)
-                batch_events.append(event)
-            
-            # Send batch to Kinesis
-            self._send_to_kinesis(batch_events)
-            
-            events_sent += batch_size_actual
-            batch_count += 1
-            
-            print(f"Sent batch {batch_count}: {events_sent}/{num_events} events")
-            
-            # Small delay between batches
-            time.sleep(0.1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while events_sent < num_events:
+                # Generate one batch of events per worker
+                batches = []
+                while len(batches) < workers and events_sent < num_events:
+                    batch_size_actual = min(batch_size, num_events - events_sent)
+                    batches.append(self._generate_events_batch(batch_size_actual))
+                    events_sent += batch_size_actual
+                
+                # Send the batches to Kinesis in parallel
+                list(executor.map(self._send_to_kinesis, batches))
+                
+                batch_count += len(batches)
+                
+                print(f"Sent batch {batch_count}: {events_sent}/{num_events} events")
         
         print(f"Successfully generated and sent {events_sent} events to {self.stream_name}")
     
@@ -187,16 +332,13 @@ class SampleDataGenerator:
         """Generate continuous data for a specified duration"""
         print(f"Generating continuous data for {duration_minutes} minutes at {events_per_minute} events/minute")
         
-        start_time = datetime.now()
-        end_time = start_time + timedelta(minutes=duration_minutes)
+        # Schedule ticks on the monotonic clock so send time does not add drift
+        next_tick = time.monotonic()
+        end_time = next_tick + duration_minutes * 60
         
-        while datetime.now() < end_time:
+        while next_tick < end_time:
             # Generate events for this minute
-            events = []
-            for _ in range(events_per_minute):
-                user = random.choice(self.users)
-                event = self._generate_event(user)
-                events.append(event)
+            events = self._generate_events_batch(events_per_minute)
             
             # Send events
             self._send_to_kinesis(events)
@@ -204,7 +346,8 @@ class SampleDataGenerator:
             print(f"Sent {events_per_minute} events at {datetime.now().strftime('%H:%M:%S')}")
             
             # Wait for next minute
-            time.sleep(60)
+            next_tick += 60.0
+            time.sleep(max(0.0, next_tick - time.monotonic()))
         
         print("Continuous data generation completed")
 
@@ -213,7 +356,10 @@ def main():
     parser.add_argument('--stream-name', required=True, help='Kinesis stream name')
     parser.add_argument('--region', default='us-east-1', help='AWS region')
     parser.add_argument('--num-events', type=int, default=1000, help='Number of events to generate')
-    parser.add_argument('--batch-size', type=int, default=10, help='Batch size for sending events')
+    parser.add_argument('--batch-size', type=int, default=KINESIS_MAX_RECORDS, help='Batch size for sending events')
+    parser.add_argument('--num-shards', type=int, help='Spread records evenly across this many shards')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+    parser.add_argument('--workers', type=int, default=8, help='Number of batches to send concurrently')
     parser.add_argument('--continuous', action='store_true', help='Generate continuous data')
     parser.add_argument('--duration', type=int, default=60, help='Duration in minutes for continuous generation')
     parser.add_argument('--events-per-minute', type=int, default=100, help='Events per minute for continuous generation')
@@ -221,12 +367,12 @@ def main():
     args = parser.parse_args()
     
     try:
-        generator = SampleDataGenerator(args.stream_name, args.region)
+        generator = SampleDataGenerator(args.stream_name, args.region, args.num_shards, args.seed)
         
         if args.continuous:
             generator.generate_continuous_data(args.duration, args.events_per_minute)
         else:
-            generator.generate_data(args.num_events, args.batch_size)
+            generator.generate_data(args.num_events, args.batch_size, args.workers)
     
     except KeyboardInterrupt:
         print("\nData generation interrupted by user")
@@ -19,6 +19,7 @@ resource "aws_lambda_function" "data_processor" {
       REDSHIFT_DATABASE   = aws_redshift_cluster.analytics_cluster.database_name
       S3_BUCKET          = aws_s3_bucket.data_lake.bucket
       SAGEMAKER_ENDPOINT = aws_sagemaker_endpoint.ml_endpoint.name
+      DLQ_URL            = var.enable_dead_letter_queues ? aws_sqs_queue.data_processor_dlq[0].url : ""
     }
   }
 
@@ -30,6 +31,34 @@ resource "aws_lambda_function" "data_processor" {
   ]
 }
 
+# Dead-letter queue for records that fail validation
+resource "aws_sqs_queue" "data_processor_dlq" {
+  count                     = var.enable_dead_letter_queues ? 1 : 0
+  name                      = "${local.name_prefix}-data-processor-dlq"
+  message_retention_seconds = 1209600
+
+  tags = local.common_tags
+}
+
+resource "aws_iam_role_policy" "data_processor_dlq_policy" {
+  count = var.enable_dead_letter_queues ? 1 : 0
+  name  = "${local.name_prefix}-data-processor-dlq-policy"
+  role  = aws_iam_role.lambda_execution_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:SendMessage"
+        ]
+        Resource = aws_sqs_queue.data_processor_dlq[0].arn
+      }
+    ]
+  })
+}
+
 data "archive_file" "data_processor_zip" {
   type        = "zip"
   source_file = "${path.module}/../lambda_functions/data_processor.py"
@@ -116,6 +145,10 @@ resource "aws_lambda_event_source_mapping" "kinesis_trigger" {
   batch_size        = 100
   maximum_batching_window_in_seconds = 5
 
+  # Retry only the records the function reports as failed, a bounded number of times
+  function_response_types = ["ReportBatchItemFailures"]
+  maximum_retry_attempts  = 5
+
   depends_on = [aws_lambda_function.data_processor]
 }
 
@@ -7,21 +7,48 @@ import json
 import boto3
 import logging
 import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Callable
 import os
+import functools
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict, is_dataclass
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-ce_client = boto3.client('ce')  # Cost Explorer
-kinesis_client = boto3.client('kinesis')
-redshift_client = boto3.client('redshift')
-sagemaker_client = boto3.client('sagemaker')
-lambda_client = boto3.client('lambda')
-cloudwatch_client = boto3.client('cloudwatch')
+# Shared client configuration: adaptive retries pace calls under throttling
+# (Cost Explorer in particular is rate limited per account), a connection pool
+# sized for the parallel analyzers, and TCP keep-alive for warm invocations
+BOTO_CONFIG = Config(
+    max_pool_connections=10,
+    tcp_keepalive=True,
+    retries={'max_attempts': 6, 'mode': 'adaptive'}
+)
+
+# AWS clients are created on first use, so a cold start only pays for the
+# services an invocation actually calls
+client_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def get_client(service_name: str) -> Any:
+    """
+    Return the shared client for a service, creating it on first use
+    """
+    # Client creation on the default session is not thread-safe
+    with client_lock:
+        return boto3.client(service_name, config=BOTO_CONFIG)
 
 # Environment variables
 KINESIS_STREAM = os.environ.get('KINESIS_STREAM')
@@ -29,6 +56,124 @@ REDSHIFT_CLUSTER = os.environ.get('REDSHIFT_CLUSTER')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT')
 S3_BUCKET = os.environ.get('S3_BUCKET')
 
+# Function whose memory configuration is analyzed and right-sized
+DATA_PROCESSOR_FUNCTION = 'data-analytics-ml-analytics-data-processor'
+
+# Cost Explorer data changes at most daily and every request is billed, so
+# costs are cached per day in the warm container and, when a dedicated bucket
+# is configured, in S3; cost data is never written to the data lake bucket
+COST_CACHE_BUCKET = os.environ.get('COST_CACHE_BUCKET')
+COST_CACHE_PREFIX = 'cost-optimizer/costs/'
+costs_cache = {}
+
+# Metric values fetched for the current hour-aligned window
+metrics_cache = {}
+
+# Shard counts, node types and instance configurations change far less often
+# than the schedule fires, so describe responses are reused while warm
+DESCRIBE_CACHE_TTL = 3600
+describe_cache = {}
+
+@dataclass(slots=True)
+class KinesisUtilization:
+    shard_count: int
+    avg_records_per_second: float
+    records_per_shard: float
+    utilization_percentage: float
+    recommendation: str
+
+@dataclass(slots=True)
+class RedshiftUtilization:
+    node_type: str
+    node_count: int
+    avg_cpu_utilization: float
+    recommendation: str
+
+@dataclass(slots=True)
+class SageMakerUtilization:
+    instance_type: str
+    instance_count: int
+    total_invocations: float
+    avg_invocations_per_hour: float
+    recommendation: str
+
+@dataclass(slots=True)
+class LambdaUtilization:
+    memory_size: int
+    timeout: int
+    total_invocations: float
+    avg_invocations_per_hour: float
+    recommendation: str
+
+@dataclass(slots=True)
+class S3Utilization:
+    bucket_size_gb: float
+    recommendation: str
+
+# (utilization record, recommendation) -> (service, action, risk level, recommendation details)
+RECOMMENDATION_RULES = {
+    (KinesisUtilization, 'scale_down'): ('kinesis', 'scale_down_shards', 'low', lambda u: {
+        'current_shards': u.shard_count,
+        'recommended_shards': max(1, u.shard_count - 1),
+        'potential_savings': 25.0  # $25 per shard per month
+    }),
+    (KinesisUtilization, 'scale_up'): ('kinesis', 'scale_up_shards', 'low', lambda u: {
+        'current_shards': u.shard_count,
+        'recommended_shards': u.shard_count + 1,
+        'potential_savings': -25.0  # Cost increase
+    }),
+    (RedshiftUtilization, 'scale_down'): ('redshift', 'scale_down_nodes', 'medium', lambda u: {
+        'current_nodes': u.node_count,
+        'recommended_nodes': max(1, u.node_count - 1),
+        'potential_savings': 150.0  # $150 per node per month
+    }),
+    (SageMakerUtilization, 'scale_down'): ('sagemaker', 'scale_down_instances', 'medium', lambda u: {
+        'current_instances': u.instance_count,
+        'recommended_instances': max(1, u.instance_count - 1),
+        'potential_savings': 50.0  # $50 per instance per month
+    }),
+    (LambdaUtilization, 'optimize_memory'): ('lambda', 'optimize_memory', 'low', lambda u: {
+        'current_memory': u.memory_size,
+        'recommended_memory': 256,  # Reduce to 256MB
+        'potential_savings': 10.0  # $10 per month
+    }),
+    (S3Utilization, 'enable_lifecycle'): ('s3', 'enable_lifecycle_policies', 'low', lambda u: {
+        'current_size_gb': u.bucket_size_gb,
+        'potential_savings': u.bucket_size_gb * 0.02  # 2 cents per GB per month
+    })
+}
+
+def json_default(obj: Any) -> Any:
+    """
+    Serialize utilization records as plain JSON objects and datetimes in ISO format
+    """
+    if is_dataclass(obj):
+        return asdict(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def json_dumps(obj: Any) -> str:
+    """
+    Serialize to a JSON string, using orjson when it is available
+    """
+    if orjson:
+        return orjson.dumps(obj, default=json_default).decode()
+    return json.dumps(obj, default=json_default)
+
+def cached(key: str, ttl: float, fn: Callable[[], Any]) -> Any:
+    """
+    Return the cached result of fn for key, calling it again once ttl seconds have passed
+    """
+    now = time.monotonic()
+    entry = describe_cache.get(key)
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+    
+    result = fn()
+    describe_cache[key] = (now, result)
+    return result
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for cost optimization
@@ -36,17 +181,20 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
         logger.info("Starting cost optimization analysis...")
         
+        # One timestamp for the whole invocation
+        now = datetime.datetime.utcnow()
+        
         # Get current costs
-        current_costs = get_current_costs()
+        current_costs = get_current_costs(now)
         
         # Analyze resource utilization
-        utilization_analysis = analyze_resource_utilization()
+        utilization_analysis = analyze_resource_utilization(now)
         
         # Generate optimization recommendations
         recommendations = generate_optimization_recommendations(current_costs, utilization_analysis)
         
         # Apply automatic optimizations
-        applied_optimizations = apply_automatic_optimizations(recommendations)
+        applied_optimizations = apply_automatic_optimizations(recommendations, now.isoformat())
         
         # Calculate potential savings
         potential_savings = calculate_potential_savings(recommendations)
@@ -57,7 +205,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             utilization_analysis, 
             recommendations, 
             applied_optimizations, 
-            potential_savings
+            potential_savings,
+            now
         )
         
         # Publish metrics to CloudWatch
@@ -67,7 +216,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': json_dumps({
                 'message': 'Cost optimization analysis completed successfully',
                 'current_costs': current_costs,
                 'potential_savings': potential_savings,
@@ -81,48 +230,32 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error(f"Error in cost optimization: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': json_dumps({
                 'error': str(e),
                 'message': 'Cost optimization failed'
             })
         }
 
-def get_current_costs() -> Dict[str, Any]:
+def get_current_costs(now: datetime.datetime) -> Dict[str, Any]:
     """
-    Get current costs for all services
+    Get current costs for all services, cached per day in the warm container and in S3
     """
     try:
         # Get costs for the last 30 days
-        end_date = datetime.date.today()
+        end_date = now.date()
         start_date = end_date - datetime.timedelta(days=30)
+        cache_key = end_date.isoformat()
         
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='MONTHLY',
-            Metrics=['BlendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ]
-        )
+        if cache_key in costs_cache:
+            return costs_cache[cache_key]
         
-        costs = {}
-        for result in response['ResultsByTime']:
-            for group in result['Groups']:
-                service = group['Keys'][0]
-                cost = float(group['Metrics']['BlendedCost']['Amount'])
-                costs[service] = cost
+        costs = load_cached_costs(cache_key)
+        if costs is None:
+            costs = fetch_current_costs(start_date, end_date)
+            store_cached_costs(cache_key, costs)
         
-        return {
-            'total_cost': sum(costs.values()),
-            'service_costs': costs,
-            'period': f"{start_date} to {end_date}"
-        }
+        costs_cache[cache_key] = costs
+        return costs
         
     except Exception as e:
         logger.error(f"Error getting current costs: {str(e)}")
@@ -132,27 +265,199 @@ def get_current_costs() -> Dict[str, Any]:
             'error': str(e)
         }
 
-def analyze_resource_utilization() -> Dict[str, Any]:
+def fetch_current_costs(start_date: datetime.date, end_date: datetime.date) -> Dict[str, Any]:
+    """
+    Query Cost Explorer for the per-service costs in a date range
+    """
+    response = get_client('ce').get_cost_and_usage(
+        TimePeriod={
+            'Start': start_date.strftime('%Y-%m-%d'),
+            'End': end_date.strftime('%Y-%m-%d')
+        },
+        Granularity='MONTHLY',
+        Metrics=['BlendedCost'],
+        GroupBy=[
+            {
+                'Type': 'DIMENSION',
+                'Key': 'SERVICE'
+            }
+        ]
+    )
+    
+    # A 30-day window spans two monthly results; per-service and total costs
+    # are accumulated across both in the same pass
+    costs = {}
+    total_cost = 0.0
+    for result in response['ResultsByTime']:
+        for group in result['Groups']:
+            service = group['Keys'][0]
+            cost = float(group['Metrics']['BlendedCost']['Amount'])
+            costs[service] = costs.get(service, 0.0) + cost
+            total_cost += cost
+    
+    return {
+        'total_cost': total_cost,
+        'service_costs': costs,
+        'period': f"{start_date} to {end_date}"
+    }
+
+def load_cached_costs(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the costs cached in S3 for a day, or None if there are none
+    """
+    if not COST_CACHE_BUCKET:
+        return None
+    
+    try:
+        response = get_client('s3').get_object(Bucket=COST_CACHE_BUCKET, Key=f"{COST_CACHE_PREFIX}{cache_key}.json")
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchKey':
+            logger.warning(f"Error reading cached costs: {str(e)}")
+        return None
+
+def store_cached_costs(cache_key: str, costs: Dict[str, Any]) -> None:
+    """
+    Cache the costs for a day in S3
+    """
+    if not COST_CACHE_BUCKET:
+        return
+    
+    try:
+        get_client('s3').put_object(
+            Bucket=COST_CACHE_BUCKET,
+            Key=f"{COST_CACHE_PREFIX}{cache_key}.json",
+            Body=json_dumps(costs),
+            ContentType='application/json'
+        )
+    except ClientError as e:
+        logger.warning(f"Error caching costs: {str(e)}")
+
+def aligned_window(now: datetime.datetime, days: int) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    Return a window of the given number of days ending at the start of the current
+    hour, so CloudWatch periods line up and repeated requests are identical
+    """
+    end_time = now.replace(minute=0, second=0, microsecond=0)
+    return end_time - datetime.timedelta(days=days), end_time
+
+def metric_query(query_id: str, namespace: str, metric_name: str, dimensions: List[Dict[str, str]],
+                 stat: str, period: int = 3600, return_data: bool = True) -> Dict[str, Any]:
+    """
+    Build a single GetMetricData query
+    """
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': namespace,
+                'MetricName': metric_name,
+                'Dimensions': dimensions
+            },
+            'Period': period,
+            'Stat': stat
+        },
+        'ReturnData': return_data
+    }
+
+def metric_expression(query_id: str, expression: str) -> Dict[str, Any]:
+    """
+    Build a GetMetricData metric math query
+    """
+    return {
+        'Id': query_id,
+        'Expression': expression
+    }
+
+def build_metric_queries() -> List[Dict[str, Any]]:
+    """
+    Build the GetMetricData queries for the configured resources
+    """
+    queries = []
+    if KINESIS_STREAM:
+        dimensions = [{'Name': 'StreamName', 'Value': KINESIS_STREAM}]
+        queries.append(metric_query('kinesis_records', 'AWS/Kinesis', 'IncomingRecords', dimensions, 'Average', return_data=False))
+        queries.append(metric_expression('kinesis_records_avg', 'AVG(kinesis_records)'))
+    if REDSHIFT_CLUSTER:
+        dimensions = [{'Name': 'ClusterIdentifier', 'Value': REDSHIFT_CLUSTER}]
+        queries.append(metric_query('redshift_cpu', 'AWS/Redshift', 'CPUUtilization', dimensions, 'Average', return_data=False))
+        queries.append(metric_expression('redshift_cpu_avg', 'AVG(redshift_cpu)'))
+    if SAGEMAKER_ENDPOINT:
+        dimensions = [{'Name': 'EndpointName', 'Value': SAGEMAKER_ENDPOINT}]
+        queries.append(metric_query('sagemaker_invocations', 'AWS/SageMaker', 'Invocations', dimensions, 'Sum', return_data=False))
+        queries.append(metric_expression('sagemaker_invocations_total', 'SUM(sagemaker_invocations)'))
+        queries.append(metric_expression('sagemaker_invocations_avg', 'AVG(sagemaker_invocations)'))
+    dimensions = [{'Name': 'FunctionName', 'Value': DATA_PROCESSOR_FUNCTION}]
+    queries.append(metric_query('lambda_invocations', 'AWS/Lambda', 'Invocations', dimensions, 'Sum', return_data=False))
+    queries.append(metric_expression('lambda_invocations_total', 'SUM(lambda_invocations)'))
+    queries.append(metric_expression('lambda_invocations_avg', 'AVG(lambda_invocations)'))
+    if S3_BUCKET:
+        dimensions = [
+            {'Name': 'BucketName', 'Value': S3_BUCKET},
+            {'Name': 'StorageType', 'Value': 'StandardStorage'}
+        ]
+        queries.append(metric_query('s3_bucket_size', 'AWS/S3', 'BucketSizeBytes', dimensions, 'Average', period=86400))
+    
+    return queries
+
+# Queries depend only on environment variables, so they are built once per container
+METRIC_DATA_QUERIES = build_metric_queries()
+
+def fetch_all_metrics(now: datetime.datetime) -> Dict[str, float]:
+    """
+    Fetch the CloudWatch metrics for every analyzed service in one GetMetricData
+    request. Hourly series are aggregated server-side with metric math, so each
+    query ID maps to a single value; queries without data are omitted.
+    """
+    # Metrics for the last 7 days, reused within the same hour
+    start_time, end_time = aligned_window(now, 7)
+    if end_time in metrics_cache:
+        return metrics_cache[end_time]
+    
+    # Values are returned newest first; the aggregate expressions repeat the same
+    # value at every timestamp, so the first value of each query is the result
+    values = {}
+    paginator = get_client('cloudwatch').get_paginator('get_metric_data')
+    for page in paginator.paginate(
+        MetricDataQueries=METRIC_DATA_QUERIES,
+        StartTime=start_time,
+        EndTime=end_time
+    ):
+        for result in page['MetricDataResults']:
+            if result['Values'] and result['Id'] not in values:
+                values[result['Id']] = result['Values'][0]
+    
+    metrics_cache.clear()
+    metrics_cache[end_time] = values
+    return values
+
+def analyze_resource_utilization(now: datetime.datetime) -> Dict[str, Any]:
     """
     Analyze resource utilization across all services
     """
+    analyzers = {
+        'kinesis': analyze_kinesis_utilization,
+        'redshift': analyze_redshift_utilization,
+        'sagemaker': analyze_sagemaker_utilization,
+        'lambda': analyze_lambda_utilization,
+        's3': analyze_s3_utilization
+    }
+    
     try:
-        utilization = {}
-        
-        # Analyze Kinesis utilization
-        utilization['kinesis'] = analyze_kinesis_utilization()
-        
-        # Analyze Redshift utilization
-        utilization['redshift'] = analyze_redshift_utilization()
+        # One CloudWatch request covers the metrics of every service
+        metrics = fetch_all_metrics(now)
         
-        # Analyze SageMaker utilization
-        utilization['sagemaker'] = analyze_sagemaker_utilization()
+        # Run the per-service analyzers in parallel; each makes its own describe calls
+        with ThreadPoolExecutor(max_workers=len(analyzers)) as executor:
+            futures = {service: executor.submit(analyzer, metrics) for service, analyzer in analyzers.items()}
         
-        # Analyze Lambda utilization
-        utilization['lambda'] = analyze_lambda_utilization()
-        
-        # Analyze S3 utilization
-        utilization['s3'] = analyze_s3_utilization()
+        utilization = {}
+        for service, future in futures.items():
+            try:
+                utilization[service] = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing {service} utilization: {str(e)}")
+                utilization[service] = {'error': str(e)}
         
         return utilization
         
@@ -160,40 +465,24 @@ def analyze_resource_utilization() -> Dict[str, Any]:
         logger.error(f"Error analyzing resource utilization: {str(e)}")
         return {}
 
-def analyze_kinesis_utilization() -> Dict[str, Any]:
+def analyze_kinesis_utilization(metrics: Dict[str, float]) -> Any:
     """
     Analyze Kinesis stream utilization
     """
+    if not KINESIS_STREAM:
+        return {'status': 'skipped', 'reason': 'KINESIS_STREAM unset'}
+    
     try:
         # Get stream description
-        response = kinesis_client.describe_stream(StreamName=KINESIS_STREAM)
-        stream_info = response['StreamDescription']
-        
-        # Get metrics for the last 7 days
-        end_time = datetime.datetime.utcnow()
-        start_time = end_time - datetime.timedelta(days=7)
-        
-        metrics = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/Kinesis',
-            MetricName='IncomingRecords',
-            Dimensions=[
-                {
-                    'Name': 'StreamName',
-                    'Value': KINESIS_STREAM
-                }
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,  # 1 hour
-            Statistics=['Average', 'Maximum']
+        response = cached(
+            'kinesis',
+            DESCRIBE_CACHE_TTL,
+            lambda: get_client('kinesis').describe_stream(StreamName=KINESIS_STREAM)
         )
+        stream_info = response['StreamDescription']
         
-        if metrics['Datapoints']:
-            avg_records = sum(point['Average'] for point in metrics['Datapoints']) / len(metrics['Datapoints'])
-            max_records = max(point['Maximum'] for point in metrics['Datapoints'])
-        else:
-            avg_records = 0
-            max_records = 0
+        # Average of the hourly metrics for the last 7 days
+        avg_records = metrics.get('kinesis_records_avg', 0)
         
         shard_count = len(stream_info['Shards'])
         records_per_shard = avg_records / shard_count if shard_count > 0 else 0
@@ -201,208 +490,142 @@ def analyze_kinesis_utilization() -> Dict[str, Any]:
         # Kinesis can handle up to 1000 records per second per shard
         utilization_percentage = (records_per_shard / 1000) * 100
         
-        return {
-            'shard_count': shard_count,
-            'avg_records_per_second': avg_records,
-            'max_records_per_second': max_records,
-            'records_per_shard': records_per_shard,
-            'utilization_percentage': utilization_percentage,
-            'recommendation': 'scale_down' if utilization_percentage < 30 else 'scale_up' if utilization_percentage > 80 else 'maintain'
-        }
+        return KinesisUtilization(
+            shard_count=shard_count,
+            avg_records_per_second=avg_records,
+            records_per_shard=records_per_shard,
+            utilization_percentage=utilization_percentage,
+            recommendation='scale_down' if utilization_percentage < 30 else 'scale_up' if utilization_percentage > 80 else 'maintain'
+        )
         
     except Exception as e:
         logger.error(f"Error analyzing Kinesis utilization: {str(e)}")
         return {'error': str(e)}
 
-def analyze_redshift_utilization() -> Dict[str, Any]:
+def analyze_redshift_utilization(metrics: Dict[str, float]) -> Any:
     """
     Analyze Redshift cluster utilization
     """
+    if not REDSHIFT_CLUSTER:
+        return {'status': 'skipped', 'reason': 'REDSHIFT_CLUSTER unset'}
+    
     try:
         # Get cluster description
-        response = redshift_client.describe_clusters(ClusterIdentifier=REDSHIFT_CLUSTER)
-        cluster = response['Clusters'][0]
-        
-        # Get CPU utilization metrics
-        end_time = datetime.datetime.utcnow()
-        start_time = end_time - datetime.timedelta(days=7)
-        
-        cpu_metrics = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/Redshift',
-            MetricName='CPUUtilization',
-            Dimensions=[
-                {
-                    'Name': 'ClusterIdentifier',
-                    'Value': REDSHIFT_CLUSTER
-                }
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Average', 'Maximum']
+        response = cached(
+            'redshift',
+            DESCRIBE_CACHE_TTL,
+            lambda: get_client('redshift').describe_clusters(ClusterIdentifier=REDSHIFT_CLUSTER)
         )
+        cluster = response['Clusters'][0]
         
-        if cpu_metrics['Datapoints']:
-            avg_cpu = sum(point['Average'] for point in cpu_metrics['Datapoints']) / len(cpu_metrics['Datapoints'])
-            max_cpu = max(point['Maximum'] for point in cpu_metrics['Datapoints'])
-        else:
-            avg_cpu = 0
-            max_cpu = 0
+        # Average of the hourly CPU utilization for the last 7 days
+        avg_cpu = metrics.get('redshift_cpu_avg', 0)
         
         node_type = cluster['NodeType']
         node_count = cluster['NumberOfNodes']
         
-        return {
-            'node_type': node_type,
-            'node_count': node_count,
-            'avg_cpu_utilization': avg_cpu,
-            'max_cpu_utilization': max_cpu,
-            'recommendation': 'scale_down' if avg_cpu < 30 else 'scale_up' if avg_cpu > 80 else 'maintain'
-        }
+        return RedshiftUtilization(
+            node_type=node_type,
+            node_count=node_count,
+            avg_cpu_utilization=avg_cpu,
+            recommendation='scale_down' if avg_cpu < 30 else 'scale_up' if avg_cpu > 80 else 'maintain'
+        )
         
     except Exception as e:
         logger.error(f"Error analyzing Redshift utilization: {str(e)}")
         return {'error': str(e)}
 
-def analyze_sagemaker_utilization() -> Dict[str, Any]:
+def analyze_sagemaker_utilization(metrics: Dict[str, float]) -> Any:
     """
     Analyze SageMaker endpoint utilization
     """
+    if not SAGEMAKER_ENDPOINT:
+        return {'status': 'skipped', 'reason': 'SAGEMAKER_ENDPOINT unset'}
+    
     try:
         # Get endpoint description
-        response = sagemaker_client.describe_endpoint(EndpointName=SAGEMAKER_ENDPOINT)
+        response = cached(
+            'sagemaker',
+            DESCRIBE_CACHE_TTL,
+            lambda: get_client('sagemaker').describe_endpoint(EndpointName=SAGEMAKER_ENDPOINT)
+        )
         endpoint = response['EndpointConfigName']
         
         # Get endpoint config
-        config_response = sagemaker_client.describe_endpoint_config(EndpointConfigName=endpoint)
-        config = config_response['ProductionVariants'][0]
-        
-        # Get invocation metrics
-        end_time = datetime.datetime.utcnow()
-        start_time = end_time - datetime.timedelta(days=7)
-        
-        invocation_metrics = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/SageMaker',
-            MetricName='Invocations',
-            Dimensions=[
-                {
-                    'Name': 'EndpointName',
-                    'Value': SAGEMAKER_ENDPOINT
-                }
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Sum']
+        config_response = cached(
+            f"sagemaker-config-{endpoint}",
+            DESCRIBE_CACHE_TTL,
+            lambda: get_client('sagemaker').describe_endpoint_config(EndpointConfigName=endpoint)
         )
+        config = config_response['ProductionVariants'][0]
         
-        if invocation_metrics['Datapoints']:
-            total_invocations = sum(point['Sum'] for point in invocation_metrics['Datapoints'])
-            avg_invocations_per_hour = total_invocations / len(invocation_metrics['Datapoints'])
-        else:
-            total_invocations = 0
-            avg_invocations_per_hour = 0
+        # Invocations for the last 7 days
+        total_invocations = metrics.get('sagemaker_invocations_total', 0)
+        avg_invocations_per_hour = metrics.get('sagemaker_invocations_avg', 0)
         
         instance_type = config['InstanceType']
         instance_count = config['InitialInstanceCount']
         
-        return {
-            'instance_type': instance_type,
-            'instance_count': instance_count,
-            'total_invocations': total_invocations,
-            'avg_invocations_per_hour': avg_invocations_per_hour,
-            'recommendation': 'scale_down' if avg_invocations_per_hour < 10 else 'scale_up' if avg_invocations_per_hour > 100 else 'maintain'
-        }
+        return SageMakerUtilization(
+            instance_type=instance_type,
+            instance_count=instance_count,
+            total_invocations=total_invocations,
+            avg_invocations_per_hour=avg_invocations_per_hour,
+            recommendation='scale_down' if avg_invocations_per_hour < 10 else 'scale_up' if avg_invocations_per_hour > 100 else 'maintain'
+        )
         
     except Exception as e:
         logger.error(f"Error analyzing SageMaker utilization: {str(e)}")
         return {'error': str(e)}
 
-def analyze_lambda_utilization() -> Dict[str, Any]:
+def analyze_lambda_utilization(metrics: Dict[str, float]) -> Any:
     """
     Analyze Lambda function utilization
     """
     try:
         # Get function configuration
-        response = lambda_client.get_function(FunctionName='data-analytics-ml-analytics-data-processor')
-        config = response['Configuration']
-        
-        # Get invocation metrics
-        end_time = datetime.datetime.utcnow()
-        start_time = end_time - datetime.timedelta(days=7)
-        
-        invocation_metrics = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/Lambda',
-            MetricName='Invocations',
-            Dimensions=[
-                {
-                    'Name': 'FunctionName',
-                    'Value': 'data-analytics-ml-analytics-data-processor'
-                }
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Sum']
+        response = cached(
+            'lambda',
+            DESCRIBE_CACHE_TTL,
+            lambda: get_client('lambda').get_function(FunctionName=DATA_PROCESSOR_FUNCTION)
         )
+        config = response['Configuration']
         
-        if invocation_metrics['Datapoints']:
-            total_invocations = sum(point['Sum'] for point in invocation_metrics['Datapoints'])
-            avg_invocations_per_hour = total_invocations / len(invocation_metrics['Datapoints'])
-        else:
-            total_invocations = 0
-            avg_invocations_per_hour = 0
+        # Invocations for the last 7 days
+        total_invocations = metrics.get('lambda_invocations_total', 0)
+        avg_invocations_per_hour = metrics.get('lambda_invocations_avg', 0)
         
         memory_size = config['MemorySize']
         timeout = config['Timeout']
         
-        return {
-            'memory_size': memory_size,
-            'timeout': timeout,
-            'total_invocations': total_invocations,
-            'avg_invocations_per_hour': avg_invocations_per_hour,
-            'recommendation': 'optimize_memory' if memory_size > 512 else 'maintain'
-        }
+        return LambdaUtilization(
+            memory_size=memory_size,
+            timeout=timeout,
+            total_invocations=total_invocations,
+            avg_invocations_per_hour=avg_invocations_per_hour,
+            recommendation='optimize_memory' if memory_size > 512 else 'maintain'
+        )
         
     except Exception as e:
         logger.error(f"Error analyzing Lambda utilization: {str(e)}")
         return {'error': str(e)}
 
-def analyze_s3_utilization() -> Dict[str, Any]:
+def analyze_s3_utilization(metrics: Dict[str, float]) -> Any:
     """
     Analyze S3 bucket utilization
     """
+    if not S3_BUCKET:
+        return {'status': 'skipped', 'reason': 'S3_BUCKET unset'}
+    
     try:
-        # Get bucket size and object count
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/S3',
-            MetricName='BucketSizeBytes',
-            Dimensions=[
-                {
-                    'Name': 'BucketName',
-                    'Value': S3_BUCKET
-                },
-                {
-                    'Name': 'StorageType',
-                    'Value': 'StandardStorage'
-                }
-            ],
-            StartTime=datetime.datetime.utcnow() - datetime.timedelta(days=1),
-            EndTime=datetime.datetime.utcnow(),
-            Period=86400,
-            Statistics=['Average']
-        )
+        # Latest daily bucket size
+        bucket_size_bytes = metrics.get('s3_bucket_size', 0)
+        bucket_size_gb = bucket_size_bytes / (1024**3)
         
-        if response['Datapoints']:
-            bucket_size_bytes = response['Datapoints'][0]['Average']
-            bucket_size_gb = bucket_size_bytes / (1024**3)
-        else:
-            bucket_size_gb = 0
-        
-        return {
-            'bucket_size_gb': bucket_size_gb,
-            'recommendation': 'enable_lifecycle' if bucket_size_gb > 100 else 'maintain'
-        }
+        return S3Utilization(
+            bucket_size_gb=bucket_size_gb,
+            recommendation='enable_lifecycle' if bucket_size_gb > 100 else 'maintain'
+        )
         
     except Exception as e:
         logger.error(f"Error analyzing S3 utilization: {str(e)}")
@@ -414,158 +637,100 @@ def generate_optimization_recommendations(current_costs: Dict[str, Any], utiliza
     """
     recommendations = []
     
-    # Kinesis recommendations
-    if 'kinesis' in utilization and 'recommendation' in utilization['kinesis']:
-        kinesis_rec = utilization['kinesis']['recommendation']
-        if kinesis_rec == 'scale_down':
-            recommendations.append({
-                'service': 'kinesis',
-                'action': 'scale_down_shards',
-                'current_shards': utilization['kinesis']['shard_count'],
-                'recommended_shards': max(1, utilization['kinesis']['shard_count'] - 1),
-                'potential_savings': 25.0,  # $25 per shard per month
-                'risk_level': 'low'
-            })
-        elif kinesis_rec == 'scale_up':
+    # Analyzers that failed return an error dict and match no rule
+    for util in utilization.values():
+        rule = RECOMMENDATION_RULES.get((type(util), getattr(util, 'recommendation', None)))
+        if rule:
+            service, action, risk_level, details = rule
             recommendations.append({
-                'service': 'kinesis',
-                'action': 'scale_up_shards',
-                'current_shards': utilization['kinesis']['shard_count'],
-                'recommended_shards': utilization['kinesis']['shard_count'] + 1,
-                'potential_savings': -25.0,  # Cost increase
-                'risk_level': 'low'
-            })
-    
-    # Redshift recommendations
-    if 'redshift' in utilization and 'recommendation' in utilization['redshift']:
-        redshift_rec = utilization['redshift']['recommendation']
-        if redshift_rec == 'scale_down':
-            recommendations.append({
-                'service': 'redshift',
-                'action': 'scale_down_nodes',
-                'current_nodes': utilization['redshift']['node_count'],
-                'recommended_nodes': max(1, utilization['redshift']['node_count'] - 1),
-                'potential_savings': 150.0,  # $150 per node per month
-                'risk_level': 'medium'
-            })
-    
-    # SageMaker recommendations
-    if 'sagemaker' in utilization and 'recommendation' in utilization['sagemaker']:
-        sagemaker_rec = utilization['sagemaker']['recommendation']
-        if sagemaker_rec == 'scale_down':
-            recommendations.append({
-                'service': 'sagemaker',
-                'action': 'scale_down_instances',
-                'current_instances': utilization['sagemaker']['instance_count'],
-                'recommended_instances': max(1, utilization['sagemaker']['instance_count'] - 1),
-                'potential_savings': 50.0,  # $50 per instance per month
-                'risk_level': 'medium'
-            })
-    
-    # Lambda recommendations
-    if 'lambda' in utilization and 'recommendation' in utilization['lambda']:
-        lambda_rec = utilization['lambda']['recommendation']
-        if lambda_rec == 'optimize_memory':
-            recommendations.append({
-                'service': 'lambda',
-                'action': 'optimize_memory',
-                'current_memory': utilization['lambda']['memory_size'],
-                'recommended_memory': 256,  # Reduce to 256MB
-                'potential_savings': 10.0,  # $10 per month
-                'risk_level': 'low'
-            })
-    
-    # S3 recommendations
-    if 's3' in utilization and 'recommendation' in utilization['s3']:
-        s3_rec = utilization['s3']['recommendation']
-        if s3_rec == 'enable_lifecycle':
-            recommendations.append({
-                'service': 's3',
-                'action': 'enable_lifecycle_policies',
-                'current_size_gb': utilization['s3']['bucket_size_gb'],
-                'potential_savings': utilization['s3']['bucket_size_gb'] * 0.02,  # 2 cents per GB per month
-                'risk_level': 'low'
+                'service': service,
+                'action': action,
+                **details(util),
+                'risk_level': risk_level
             })
     
     return recommendations
 
-def apply_automatic_optimizations(recommendations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def apply_automatic_optimizations(recommendations: List[Dict[str, Any]], now_iso: str) -> List[Dict[str, Any]]:
     """
-    Apply automatic optimizations for low-risk recommendations
+    Apply automatic optimizations for low-risk recommendations, in parallel
     """
-    applied = []
+    low_risk = [rec for rec in recommendations if rec['risk_level'] == 'low']
+    if not low_risk:
+        return []
     
-    for rec in recommendations:
-        if rec['risk_level'] == 'low':
-            try:
-                if rec['service'] == 'lambda' and rec['action'] == 'optimize_memory':
-                    # Apply Lambda memory optimization
-                    lambda_client.update_function_configuration(
-                        FunctionName='data-analytics-ml-analytics-data-processor',
-                        MemorySize=rec['recommended_memory']
-                    )
-                    applied.append({
-                        'recommendation': rec,
-                        'status': 'applied',
-                        'timestamp': datetime.datetime.utcnow().isoformat()
-                    })
-                    logger.info(f"Applied Lambda memory optimization: {rec['recommended_memory']}MB")
-                
-                elif rec['service'] == 'kinesis' and rec['action'] == 'scale_down_shards':
-                    # Apply Kinesis shard scaling
-                    kinesis_client.update_shard_count(
-                        StreamName=KINESIS_STREAM,
-                        TargetShardCount=rec['recommended_shards'],
-                        ScalingType='UNIFORM_SCALING'
-                    )
-                    applied.append({
-                        'recommendation': rec,
-                        'status': 'applied',
-                        'timestamp': datetime.datetime.utcnow().isoformat()
-                    })
-                    logger.info(f"Applied Kinesis shard scaling: {rec['recommended_shards']} shards")
-                
-            except Exception as e:
-                logger.error(f"Failed to apply optimization {rec['action']}: {str(e)}")
-                applied.append({
-                    'recommendation': rec,
-                    'status': 'failed',
-                    'error': str(e),
-                    'timestamp': datetime.datetime.utcnow().isoformat()
-                })
+    with ThreadPoolExecutor(max_workers=len(low_risk)) as executor:
+        results = executor.map(lambda rec: apply_optimization(rec, now_iso), low_risk)
     
-    return applied
+    return [result for result in results if result is not None]
+
+def apply_optimization(rec: Dict[str, Any], now_iso: str) -> Optional[Dict[str, Any]]:
+    """
+    Apply a single optimization, returning its outcome or None if it has no automatic action
+    """
+    try:
+        if rec['service'] == 'lambda' and rec['action'] == 'optimize_memory':
+            # Apply Lambda memory optimization
+            get_client('lambda').update_function_configuration(
+                FunctionName=DATA_PROCESSOR_FUNCTION,
+                MemorySize=rec['recommended_memory']
+            )
+            describe_cache.pop('lambda', None)
+            logger.info(f"Applied Lambda memory optimization: {rec['recommended_memory']}MB")
+        
+        elif rec['service'] == 'kinesis' and rec['action'] == 'scale_down_shards':
+            # Apply Kinesis shard scaling
+            get_client('kinesis').update_shard_count(
+                StreamName=KINESIS_STREAM,
+                TargetShardCount=rec['recommended_shards'],
+                ScalingType='UNIFORM_SCALING'
+            )
+            describe_cache.pop('kinesis', None)
+            logger.info(f"Applied Kinesis shard scaling: {rec['recommended_shards']} shards")
+        
+        else:
+            return None
+        
+        return {
+            'recommendation': rec,
+            'status': 'applied',
+            'timestamp': now_iso
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to apply optimization {rec['action']}: {str(e)}")
+        return {
+            'recommendation': rec,
+            'status': 'failed',
+            'error': str(e),
+            'timestamp': now_iso
+        }
 
 def calculate_potential_savings(recommendations: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Calculate potential cost savings from recommendations
     """
-    total_savings = 0
-    monthly_savings = 0
-    annual_savings = 0
-    
-    for rec in recommendations:
-        savings = rec.get('potential_savings', 0)
-        if savings > 0:
-            total_savings += savings
-            monthly_savings += savings
-            annual_savings += savings * 12
+    # Savings are monthly figures; recommendations that add cost are not counted
+    savings = (rec.get('potential_savings', 0) for rec in recommendations)
+    total_savings = sum(amount for amount in savings if amount > 0)
     
     return {
         'total_savings': total_savings,
-        'monthly_savings': monthly_savings,
-        'annual_savings': annual_savings,
+        'monthly_savings': total_savings,
+        'annual_savings': total_savings * 12,
         'savings_percentage': (total_savings / 1000) * 100 if total_savings > 0 else 0  # Assuming $1000 baseline
     }
 
 def generate_cost_optimization_report(current_costs: Dict[str, Any], utilization: Dict[str, Any], 
                                     recommendations: List[Dict[str, Any]], applied: List[Dict[str, Any]], 
-                                    savings: Dict[str, Any]) -> Dict[str, Any]:
+                                    savings: Dict[str, Any], now: datetime.datetime) -> Dict[str, Any]:
     """
     Generate comprehensive cost optimization report
     """
+    status_counts = Counter(a['status'] for a in applied)
+    
     return {
-        'report_timestamp': datetime.datetime.utcnow().isoformat(),
+        'report_timestamp': now,
         'current_costs': current_costs,
         'resource_utilization': utilization,
         'recommendations': recommendations,
@@ -573,40 +738,37 @@ def generate_cost_optimization_report(current_costs: Dict[str, Any], utilization
         'potential_savings': savings,
         'summary': {
             'total_recommendations': len(recommendations),
-            'applied_optimizations': len([a for a in applied if a['status'] == 'applied']),
-            'failed_optimizations': len([a for a in applied if a['status'] == 'failed']),
-            'pending_optimizations': len([r for r in recommendations if r['risk_level'] != 'low'])
+            'applied_optimizations': status_counts['applied'],
+            'failed_optimizations': status_counts['failed'],
+            'pending_optimizations': sum(1 for r in recommendations if r['risk_level'] != 'low')
         },
-        'next_optimization_schedule': (datetime.datetime.utcnow() + datetime.timedelta(days=1)).isoformat()
+        'next_optimization_schedule': now + datetime.timedelta(days=1)
     }
 
 def publish_cost_optimization_metrics(current_costs: Dict[str, Any], savings: Dict[str, Any]) -> None:
     """
-    Publish cost optimization metrics to CloudWatch
+    Publish cost optimization metrics to CloudWatch in embedded metric format
     """
     try:
-        metrics = [
-            {
-                'MetricName': 'CurrentMonthlyCost',
-                'Value': current_costs.get('total_cost', 0),
-                'Unit': 'None'
-            },
-            {
-                'MetricName': 'PotentialMonthlySavings',
-                'Value': savings.get('monthly_savings', 0),
-                'Unit': 'None'
+        # CloudWatch Logs extracts the metrics from this log line, so publishing
+        # them costs no PutMetricData request
+        print(json_dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': 'DataAnalytics/CostOptimization',
+                    'Dimensions': [[]],
+                    'Metrics': [
+                        {'Name': 'CurrentMonthlyCost', 'Unit': 'None'},
+                        {'Name': 'PotentialMonthlySavings', 'Unit': 'None'},
+                        {'Name': 'SavingsPercentage', 'Unit': 'Percent'}
+                    ]
+                }]
             },
-            {
-                'MetricName': 'SavingsPercentage',
-                'Value': savings.get('savings_percentage', 0),
-                'Unit': 'Percent'
-            }
-        ]
-        
-        cloudwatch_client.put_metric_data(
-            Namespace='DataAnalytics/CostOptimization',
-            MetricData=metrics
-        )
+            'CurrentMonthlyCost': current_costs.get('total_cost', 0),
+            'PotentialMonthlySavings': savings.get('monthly_savings', 0),
+            'SavingsPercentage': savings.get('savings_percentage', 0)
+        }))
         
         logger.info("Cost optimization metrics published to CloudWatch")
         
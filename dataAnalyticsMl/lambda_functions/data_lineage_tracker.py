@@ -6,48 +6,170 @@ Tracks data lineage and transformations across the analytics platform
 import json
 import boto3
 import logging
+import gzip
 import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import os
+import functools
+from botocore.config import Config
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Shared client configuration: TCP keep-alive so warm invocations reuse
+# HTTPS connections, a larger connection pool and adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
 # Initialize AWS clients
-s3_client = boto3.client('s3')
-glue_client = boto3.client('glue')
-kinesis_client = boto3.client('kinesis')
+s3_client = boto3.client('s3', config=BOTO_CONFIG)
+
+@functools.lru_cache(maxsize=None)
+def get_glue_client() -> Any:
+    """
+    Return the Glue client, created on first use since warm invocations
+    for a known partition never call Glue
+    """
+    return boto3.client('glue', config=BOTO_CONFIG)
 
 # Environment variables
 S3_BUCKET = os.environ.get('S3_BUCKET')
 GLUE_DATABASE = os.environ.get('GLUE_DATABASE')
 GLUE_TABLE = os.environ.get('GLUE_TABLE')
 
+# Lineage prefix of an hourly partition, filled in with (year, month, day, hour)
+LINEAGE_PREFIX_TEMPLATE = "lineage/year={0}/month={1:02d}/day={2:02d}/hour={3:02d}/"
+
+# Hourly partitions already registered in Glue, remembered across warm invocations
+known_partitions = set()
+
+# Lineage attributes for each kind of event, applied on top of the common fields
+KINESIS_LINEAGE = {
+    'source_system': 'kinesis',
+    'source_table': 'unknown',  # replaced by the stream name
+    'source_column': 'data',
+    'target_system': 'lambda',
+    'target_table': 'data_processor',
+    'target_column': 'processed_data',
+    'transformation_type': 'stream_processing',
+    'transformation_logic': 'Real-time data processing and enrichment',
+    'data_quality_rules': 'Schema validation, data type checking, completeness validation',
+    'business_owner': 'data_engineering_team'
+}
+
+# Keyed by a substring of the function name; the first match applies
+LAMBDA_LINEAGE = {
+    'data-processor': {
+        'source_system': 'lambda',
+        'source_table': 'data_processor',
+        'source_column': 'processed_data',
+        'target_system': 'redshift',
+        'target_table': 'events',
+        'target_column': 'all_columns',
+        'transformation_type': 'data_enrichment',
+        'transformation_logic': 'Feature engineering, ML inference, data validation',
+        'data_quality_rules': 'Business rule validation, ML model validation',
+        'business_owner': 'data_science_team'
+    },
+    'ml-inference': {
+        'source_system': 'lambda',
+        'source_table': 'ml_inference',
+        'source_column': 'prediction_data',
+        'target_system': 'redshift',
+        'target_table': 'ml_predictions',
+        'target_column': 'prediction_results',
+        'transformation_type': 'ml_inference',
+        'transformation_logic': 'Real-time ML prediction and feature engineering',
+        'data_quality_rules': 'Model validation, confidence threshold checking',
+        'business_owner': 'ml_engineering_team'
+    },
+    'data-quality': {
+        'source_system': 'lambda',
+        'source_table': 'data_quality_checker',
+        'source_column': 'quality_metrics',
+        'target_system': 'cloudwatch',
+        'target_table': 'quality_alerts',
+        'target_column': 'alert_data',
+        'transformation_type': 'quality_monitoring',
+        'transformation_logic': 'Data quality assessment and anomaly detection',
+        'data_quality_rules': 'Completeness, consistency, freshness validation',
+        'business_owner': 'data_governance_team'
+    }
+}
+
+# Keyed by a substring of the object key; the first match applies
+S3_LINEAGE = {
+    'events/': {
+        'source_system': 's3',
+        'source_table': 'data_lake',
+        'source_column': 'raw_events',
+        'target_system': 'athena',
+        'target_table': 'events_table',
+        'target_column': 'partitioned_data',
+        'transformation_type': 'data_partitioning',
+        'transformation_logic': 'Time-based partitioning for query optimization',
+        'data_quality_rules': 'Partition integrity, data format validation',
+        'business_owner': 'data_engineering_team'
+    },
+    'lineage/': {
+        'source_system': 's3',
+        'source_table': 'lineage_storage',
+        'source_column': 'lineage_metadata',
+        'target_system': 'glue',
+        'target_table': 'data_lineage',
+        'target_column': 'lineage_records',
+        'transformation_type': 'metadata_management',
+        'transformation_logic': 'Data lineage tracking and metadata management',
+        'data_quality_rules': 'Lineage completeness, metadata validation',
+        'business_owner': 'data_governance_team'
+    }
+}
+
+def json_bytes(obj: Any) -> bytes:
+    """
+    Serialize to UTF-8 encoded JSON, using orjson when it is available
+    """
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for data lineage tracking
     """
     try:
-        logger.info(f"Processing lineage event: {json.dumps(event)}")
+        logger.debug("Processing lineage event: %s", event)
+        
+        # One timestamp for the whole invocation, also used for partitioning
+        created_at = datetime.utcnow()
+        created_at_iso = created_at.isoformat()
         
         # Extract lineage information from event
-        lineage_info = extract_lineage_info(event)
+        lineage_info = extract_lineage_info(event, created_at_iso)
         
         if lineage_info:
             # Store lineage information
-            store_lineage_info(lineage_info)
+            store_lineage_info(lineage_info, created_at)
             
             # Update lineage metadata
-            update_lineage_metadata(lineage_info)
+            update_lineage_metadata(lineage_info, created_at)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Data lineage tracked successfully',
                 'lineage_id': lineage_info.get('lineage_id') if lineage_info else None,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': created_at_iso
             })
         }
         
@@ -61,7 +183,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             })
         }
 
-def extract_lineage_info(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def extract_lineage_info(event: Dict[str, Any], created_at: str) -> Optional[Dict[str, Any]]:
     """
     Extract lineage information from the event
     """
@@ -73,22 +195,19 @@ def extract_lineage_info(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         
         lineage_info = {
             'lineage_id': str(uuid.uuid4()),
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat(),
+            'created_at': created_at,
+            'updated_at': created_at,
             'created_by': 'system',
             'data_classification': 'internal',
             'retention_policy': '7_years'
         }
         
-        if event_source == 'aws.kinesis':
-            return extract_kinesis_lineage(detail, lineage_info)
-        elif event_source == 'aws.lambda':
-            return extract_lambda_lineage(detail, lineage_info)
-        elif event_source == 'aws.s3':
-            return extract_s3_lineage(detail, lineage_info)
-        else:
+        extractor = LINEAGE_EXTRACTORS.get(event_source)
+        if extractor is None:
             logger.warning(f"Unknown event source: {event_source}")
             return None
+        
+        return extractor(detail, lineage_info)
             
     except Exception as e:
         logger.error(f"Error extracting lineage info: {str(e)}")
@@ -100,18 +219,7 @@ def extract_kinesis_lineage(detail: Dict[str, Any], lineage_info: Dict[str, Any]
     """
     stream_name = detail.get('streamName', 'unknown')
     
-    lineage_info.update({
-        'source_system': 'kinesis',
-        'source_table': stream_name,
-        'source_column': 'data',
-        'target_system': 'lambda',
-        'target_table': 'data_processor',
-        'target_column': 'processed_data',
-        'transformation_type': 'stream_processing',
-        'transformation_logic': 'Real-time data processing and enrichment',
-        'data_quality_rules': 'Schema validation, data type checking, completeness validation',
-        'business_owner': 'data_engineering_team'
-    })
+    lineage_info.update(KINESIS_LINEAGE, source_table=stream_name)
     
     return lineage_info
 
@@ -121,45 +229,9 @@ def extract_lambda_lineage(detail: Dict[str, Any], lineage_info: Dict[str, Any])
     """
     function_name = detail.get('functionName', 'unknown')
     
-    if 'data-processor' in function_name:
-        lineage_info.update({
-            'source_system': 'lambda',
-            'source_table': 'data_processor',
-            'source_column': 'processed_data',
-            'target_system': 'redshift',
-            'target_table': 'events',
-            'target_column': 'all_columns',
-            'transformation_type': 'data_enrichment',
-            'transformation_logic': 'Feature engineering, ML inference, data validation',
-            'data_quality_rules': 'Business rule validation, ML model validation',
-            'business_owner': 'data_science_team'
-        })
-    elif 'ml-inference' in function_name:
-        lineage_info.update({
-            'source_system': 'lambda',
-            'source_table': 'ml_inference',
-            'source_column': 'prediction_data',
-            'target_system': 'redshift',
-            'target_table': 'ml_predictions',
-            'target_column': 'prediction_results',
-            'transformation_type': 'ml_inference',
-            'transformation_logic': 'Real-time ML prediction and feature engineering',
-            'data_quality_rules': 'Model validation, confidence threshold checking',
-            'business_owner': 'ml_engineering_team'
-        })
-    elif 'data-quality' in function_name:
-        lineage_info.update({
-            'source_system': 'lambda',
-            'source_table': 'data_quality_checker',
-            'source_column': 'quality_metrics',
-            'target_system': 'cloudwatch',
-            'target_table': 'quality_alerts',
-            'target_column': 'alert_data',
-            'transformation_type': 'quality_monitoring',
-            'transformation_logic': 'Data quality assessment and anomaly detection',
-            'data_quality_rules': 'Completeness, consistency, freshness validation',
-            'business_owner': 'data_governance_team'
-        })
+    name = classify_function(function_name)
+    if name is not None:
+        lineage_info.update(LAMBDA_LINEAGE[name])
     
     return lineage_info
 
@@ -170,50 +242,44 @@ def extract_s3_lineage(detail: Dict[str, Any], lineage_info: Dict[str, Any]) ->
     bucket_name = detail.get('bucket', {}).get('name', 'unknown')
     object_key = detail.get('object', {}).get('key', 'unknown')
     
-    if 'events/' in object_key:
-        lineage_info.update({
-            'source_system': 's3',
-            'source_table': 'data_lake',
-            'source_column': 'raw_events',
-            'target_system': 'athena',
-            'target_table': 'events_table',
-            'target_column': 'partitioned_data',
-            'transformation_type': 'data_partitioning',
-            'transformation_logic': 'Time-based partitioning for query optimization',
-            'data_quality_rules': 'Partition integrity, data format validation',
-            'business_owner': 'data_engineering_team'
-        })
-    elif 'lineage/' in object_key:
-        lineage_info.update({
-            'source_system': 's3',
-            'source_table': 'lineage_storage',
-            'source_column': 'lineage_metadata',
-            'target_system': 'glue',
-            'target_table': 'data_lineage',
-            'target_column': 'lineage_records',
-            'transformation_type': 'metadata_management',
-            'transformation_logic': 'Data lineage tracking and metadata management',
-            'data_quality_rules': 'Lineage completeness, metadata validation',
-            'business_owner': 'data_governance_team'
-        })
+    for prefix, attributes in S3_LINEAGE.items():
+        if prefix in object_key:
+            lineage_info.update(attributes)
+            break
     
     return lineage_info
 
-def store_lineage_info(lineage_info: Dict[str, Any]) -> None:
+@functools.lru_cache(maxsize=4096)
+def classify_function(function_name: str) -> Optional[str]:
     """
-    Store lineage information in S3
+    Return the LAMBDA_LINEAGE key matching a function name, remembered across
+    warm invocations since the same few functions report over and over
+    """
+    return next((name for name in LAMBDA_LINEAGE if name in function_name), None)
+
+# Lineage extractor for each EventBridge event source
+LINEAGE_EXTRACTORS = {
+    'aws.kinesis': extract_kinesis_lineage,
+    'aws.lambda': extract_lambda_lineage,
+    'aws.s3': extract_s3_lineage
+}
+
+def store_lineage_info(lineage_info: Dict[str, Any], timestamp: datetime) -> None:
+    """
+    Store lineage information in S3, partitioned by its creation time
     """
     try:
         # Create S3 key with partitioning
-        timestamp = datetime.fromisoformat(lineage_info['created_at'].replace('Z', '+00:00'))
-        s3_key = f"lineage/year={timestamp.year}/month={timestamp.month:02d}/day={timestamp.day:02d}/hour={timestamp.hour:02d}/{lineage_info['lineage_id']}.json"
+        partition = (timestamp.year, timestamp.month, timestamp.day, timestamp.hour)
+        s3_key = LINEAGE_PREFIX_TEMPLATE.format(*partition) + lineage_info['lineage_id'] + '.json.gz'
         
         # Upload to S3
         s3_client.put_object(
             Bucket=S3_BUCKET,
             Key=s3_key,
-            Body=json.dumps(lineage_info, indent=2),
+            Body=gzip.compress(json_bytes(lineage_info), compresslevel=1),
             ContentType='application/json',
+            ContentEncoding='gzip',
             Metadata={
                 'lineage_id': lineage_info['lineage_id'],
                 'source_system': lineage_info.get('source_system', 'unknown'),
@@ -228,28 +294,29 @@ def store_lineage_info(lineage_info: Dict[str, Any]) -> None:
         logger.error(f"Error storing lineage info: {str(e)}")
         raise
 
-def update_lineage_metadata(lineage_info: Dict[str, Any]) -> None:
+def update_lineage_metadata(lineage_info: Dict[str, Any], timestamp: datetime) -> None:
     """
-    Update lineage metadata in Glue Data Catalog
+    Update lineage metadata in Glue Data Catalog for the partition of its creation time
     """
     try:
+        # Every event in the same hour maps to the same partition
+        partition = (timestamp.year, timestamp.month, timestamp.day, timestamp.hour)
+        if partition in known_partitions:
+            return
+        
         # Create or update table partition
-        partition_values = [
-            str(datetime.fromisoformat(lineage_info['created_at'].replace('Z', '+00:00')).year),
-            f"{datetime.fromisoformat(lineage_info['created_at'].replace('Z', '+00:00')).month:02d}",
-            f"{datetime.fromisoformat(lineage_info['created_at'].replace('Z', '+00:00')).day:02d}",
-            f"{datetime.fromisoformat(lineage_info['created_at'].replace('Z', '+00:00')).hour:02d}"
-        ]
+        partition_prefix = LINEAGE_PREFIX_TEMPLATE.format(*partition)
+        partition_values = [f"{value:02d}" for value in partition]
         
         # Add partition to Glue table
-        glue_client.batch_create_partition(
+        response = get_glue_client().batch_create_partition(
             DatabaseName=GLUE_DATABASE,
             TableName=GLUE_TABLE,
             PartitionInputList=[
                 {
                     'Values': partition_values,
                     'StorageDescriptor': {
-                        'Location': f"s3://{S3_BUCKET}/lineage/year={partition_values[0]}/month={partition_values[1]}/day={partition_values[2]}/hour={partition_values[3]}/",
+                        'Location': f"s3://{S3_BUCKET}/{partition_prefix}",
                         'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
                         'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
                         'SerdeInfo': {
@@ -260,6 +327,12 @@ def update_lineage_metadata(lineage_info: Dict[str, Any]) -> None:
             ]
         )
         
+        # Glue reports per-partition failures in the response rather than raising
+        for error in response.get('Errors', []):
+            if error['ErrorDetail']['ErrorCode'] != 'AlreadyExistsException':
+                raise Exception(error['ErrorDetail'].get('ErrorMessage', error['ErrorDetail']['ErrorCode']))
+        
+        known_partitions.add(partition)
         logger.info(f"Updated lineage metadata in Glue: {partition_values}")
         
     except Exception as e:
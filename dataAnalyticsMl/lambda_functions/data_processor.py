@@ -5,57 +5,217 @@ Processes streaming data from Kinesis and stores it in Redshift
 
 import json
 import boto3
-import base64
+import binascii
+import gzip
+import io
 import logging
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set, Tuple
 import os
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; feature batches are sent as JSON without it
+    np = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Shared client configuration: TCP keep-alive so warm invocations reuse
+# HTTPS connections, a larger connection pool and adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
 # Initialize AWS clients
-redshift_client = boto3.client('redshift-data')
-s3_client = boto3.client('s3')
-sagemaker_client = boto3.client('sagemaker-runtime')
+redshift_client = boto3.client('redshift-data', config=BOTO_CONFIG)
+s3_client = boto3.client('s3', config=BOTO_CONFIG)
+
+@functools.lru_cache(maxsize=None)
+def get_sagemaker_client() -> Any:
+    """
+    Return the SageMaker runtime client, created on first use since many
+    batches contain no events to score
+    """
+    return boto3.client('sagemaker-runtime', config=BOTO_CONFIG)
+
+@functools.lru_cache(maxsize=None)
+def get_local_model() -> Optional[Dict[str, Any]]:
+    """
+    Load the in-process model package once per container, or return None to
+    use the SageMaker endpoint
+    """
+    if not LOCAL_MODEL_PATH or np is None:
+        return None
+    
+    try:
+        import joblib
+        return joblib.load(LOCAL_MODEL_PATH)
+    except Exception as e:
+        logger.error(f"Error loading local model, using SageMaker endpoint: {str(e)}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_sqs_client() -> Any:
+    """
+    Return the SQS client, created on first use since only batches with
+    invalid records send anything to the dead-letter queue
+    """
+    return boto3.client('sqs', config=BOTO_CONFIG)
 
 # Environment variables
 REDSHIFT_CLUSTER_ID = os.environ.get('REDSHIFT_CLUSTER_ID')
 REDSHIFT_DATABASE = os.environ.get('REDSHIFT_DATABASE')
 S3_BUCKET = os.environ.get('S3_BUCKET')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT')
+DLQ_URL = os.environ.get('DLQ_URL')
+
+# Optional model package (the model.pkl built for the SageMaker endpoint) shipped
+# in a layer; when set, batches are scored in-process instead of over the network
+LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH')
+
+# SQS SendMessageBatch accepts at most 10 entries and 256 KiB per request
+DLQ_BATCH_SIZE = 10
+DLQ_BATCH_MAX_BYTES = 256 * 1024
+
+# Dead-letter messages point at the Kinesis record and keep only a prefix of its
+# base64 data, since a record can be four times larger than an SQS message
+DLQ_DATA_PREFIX_CHARS = 16 * 1024
+
+# Rows per INSERT statement
+REDSHIFT_BATCH_SIZE = 100
+
+# Multi-row INSERT with named parameters suffixed by the row index, so
+# batches of the same size share one statement text and its cached plan
+REDSHIFT_COLUMNS = (
+    'timestamp', 'user_id', 'event_type', 'value',
+    'session_duration', 'user_segment', 'ml_prediction', 'processed_at'
+)
+REDSHIFT_INSERT_SQL = f"INSERT INTO events ({', '.join(REDSHIFT_COLUMNS)}) VALUES "
+
+# Objects above the threshold are uploaded as parallel multipart uploads
+S3_MULTIPART_THRESHOLD = 4 * 1024 * 1024
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_THRESHOLD,
+    max_concurrency=10,
+    use_threads=True
+)
+
+# Conditional writes (IfNoneMatch) need botocore 1.35 or later; on older
+# runtimes existing objects are detected with a HEAD request instead
+S3_CONDITIONAL_WRITES = 'IfNoneMatch' in s3_client.meta.service_model.operation_model('PutObject').input_shape.members
+
+# Data lake prefix of an hourly partition, filled in with (year, month, day, hour)
+EVENTS_PREFIX_TEMPLATE = "events/year={0}/month={1:02d}/day={2:02d}/hour={3:02d}/"
+
+# Record validation rules
+REQUIRED_FIELDS = ('timestamp', 'user_id', 'event_type')
+REQUIRED_FIELD_SET = frozenset(REQUIRED_FIELDS)
+NUMERIC_FIELDS = ('value', 'session_duration')
+VALID_EVENT_TYPES = frozenset({'view', 'click', 'purchase', 'signup', 'login', 'logout'})
+
+# Event types scored by the ML endpoint
+ML_EVENT_TYPES = frozenset({'purchase', 'view', 'click'})
+
+# Worker threads for the network-bound work of a batch, kept across warm invocations
+io_executor = ThreadPoolExecutor(max_workers=16)
+
+def json_dumps(obj: Any) -> str:
+    """
+    Serialize to a JSON string, using orjson when it is available
+    """
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+def json_bytes(obj: Any) -> bytes:
+    """
+    Serialize to UTF-8 encoded JSON, using orjson when it is available
+    """
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def json_loads(data: Any) -> Any:
+    """
+    Parse JSON from str or bytes, using orjson when it is available
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for processing Kinesis records
     """
     try:
-        logger.info(f"Processing {len(event['Records'])} records")
+        logger.info("Processing %d records", len(event['Records']))
         
         processed_records = []
         failed_records = []
+        processed_rows = []
+        invalid_records = []
         
         for record in event['Records']:
+            sequence_number = record['kinesis']['sequenceNumber']
             try:
-                # Decode Kinesis data
-                payload = base64.b64decode(record['kinesis']['data']).decode('utf-8')
-                data = json.loads(payload)
-                
-                # Process the record
-                processed_data = process_record(data)
-                
-                # Store in Redshift
-                store_in_redshift(processed_data)
-                
-                # Store in S3 for data lake
-                store_in_s3(processed_data)
-                
-                processed_records.append(record['kinesis']['sequenceNumber'])
-                
+                processed_rows.append(decode_and_enrich_record(record))
+                processed_records.append(sequence_number)
+            except ValueError as e:
+                # Malformed or invalid data fails the same way on every retry
+                logger.error(f"Invalid record {sequence_number}: {str(e)}")
+                invalid_records.append((record, e))
             except Exception as e:
-                logger.error(f"Error processing record {record['kinesis']['sequenceNumber']}: {str(e)}")
-                failed_records.append(record['kinesis']['sequenceNumber'])
+                logger.error(f"Error processing record {sequence_number}: {str(e)}")
+                failed_records.append(sequence_number)
+        
+        # Park invalid records in the dead-letter queue rather than retrying them
+        dead_lettered_records = send_to_dlq(invalid_records)
+        failed_records.extend(
+            record['kinesis']['sequenceNumber'] for record, _ in invalid_records
+            if record['kinesis']['sequenceNumber'] not in dead_lettered_records
+        )
+        
+        # Score every eligible record with a single ML endpoint request
+        ml_rows = [data for data in processed_rows if data.get('event_type') in ML_EVENT_TYPES]
+        if ml_rows:
+            predictions = get_ml_predictions([extract_ml_features(data) for data in ml_rows])
+            for data, prediction in zip(ml_rows, predictions):
+                data['ml_prediction'] = prediction
+        
+        # Store the whole batch in Redshift and in the S3 data lake, concurrently
+        if processed_rows:
+            futures = [
+                io_executor.submit(store_in_redshift, processed_rows),
+                io_executor.submit(store_in_s3, processed_rows, processed_records[0])
+            ]
+            if any(future.exception() for future in futures):
+                failed_records.extend(processed_records)
+                processed_records = []
+            else:
+                # Only the rows that could not be stored are retried
+                unstored_rows = {id(data) for future in futures for data in future.result()}
+                stored_records = []
+                for data, sequence_number in zip(processed_rows, processed_records):
+                    if id(data) in unstored_rows:
+                        failed_records.append(sequence_number)
+                    else:
+                        stored_records.append(sequence_number)
+                processed_records = stored_records
         
         logger.info(f"Successfully processed {len(processed_records)} records")
         if failed_records:
@@ -63,35 +223,101 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': json_dumps({
                 'processed': len(processed_records),
                 'failed': len(failed_records),
+                'dead_lettered': len(dead_lettered_records),
                 'processed_records': processed_records,
                 'failed_records': failed_records
-            })
+            }),
+            # Partial batch response, so Kinesis retries only the failed records
+            'batchItemFailures': [
+                {'itemIdentifier': sequence_number} for sequence_number in failed_records
+            ]
         }
         
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}")
         raise e
 
+def decode_and_enrich_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode and enrich a single Kinesis record. Undecodable or invalid data
+    raises ValueError.
+    """
+    # Decode Kinesis data; the JSON parsers accept the raw bytes
+    data = json_loads(binascii.a2b_base64(record['kinesis']['data']))
+    
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    
+    # Validate and enrich the record; ML inference runs per batch
+    return enrich_record(data)
+
+def build_dlq_message(record: Dict[str, Any], error: Exception) -> str:
+    """
+    Build the dead-letter message for an invalid Kinesis record: where to find
+    the record in the stream, why it was rejected and the start of its data
+    """
+    data = record['kinesis']['data']
+    return json_dumps({
+        'sequenceNumber': record['kinesis']['sequenceNumber'],
+        'partitionKey': record['kinesis'].get('partitionKey'),
+        'eventID': record.get('eventID'),
+        'eventSourceARN': record.get('eventSourceARN'),
+        'error': str(error),
+        'data': data[:DLQ_DATA_PREFIX_CHARS],
+        'truncated': len(data) > DLQ_DATA_PREFIX_CHARS
+    })
+
+def send_to_dlq(invalid_records: List[Tuple[Dict[str, Any], Exception]]) -> Set[str]:
+    """
+    Send invalid records to the dead-letter queue in SQS SendMessageBatch calls
+    of at most 10 entries and 256 KiB, and return the sequence numbers that
+    were accepted
+    """
+    dead_lettered_records = set()
+    if not DLQ_URL or not invalid_records:
+        return dead_lettered_records
+    
+    # Group the entries into batches within both SendMessageBatch limits
+    batches = [[]]
+    batch_bytes = 0
+    for i, (record, error) in enumerate(invalid_records):
+        entry = {'Id': str(i), 'MessageBody': build_dlq_message(record, error)}
+        entry_bytes = len(entry['MessageBody'].encode())
+        if batches[-1] and (len(batches[-1]) == DLQ_BATCH_SIZE or batch_bytes + entry_bytes > DLQ_BATCH_MAX_BYTES):
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(entry)
+        batch_bytes += entry_bytes
+    
+    for entries in batches:
+        try:
+            response = get_sqs_client().send_message_batch(
+                QueueUrl=DLQ_URL,
+                Entries=entries
+            )
+        except Exception as e:
+            logger.error(f"Error sending records to the dead-letter queue: {str(e)}")
+            continue
+        
+        for success in response.get('Successful', []):
+            record, _ = invalid_records[int(success['Id'])]
+            dead_lettered_records.add(record['kinesis']['sequenceNumber'])
+    
+    logger.info(f"Sent {len(dead_lettered_records)} invalid records to the dead-letter queue")
+    return dead_lettered_records
+
 def process_record(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Process and enrich the incoming data record
     """
     try:
-        # Add processing timestamp
-        data['processed_at'] = datetime.utcnow().isoformat()
-        
-        # Perform data validation
-        validate_data(data)
-        
-        # Enrich data with additional fields
-        data['session_duration'] = calculate_session_duration(data)
-        data['user_segment'] = determine_user_segment(data)
+        data = enrich_record(data)
         
         # Perform ML inference if applicable
-        if data.get('event_type') in ['purchase', 'view', 'click']:
+        if data.get('event_type') in ML_EVENT_TYPES:
             ml_features = extract_ml_features(data)
             prediction = get_ml_prediction(ml_features)
             data['ml_prediction'] = prediction
@@ -102,26 +328,48 @@ def process_record(data: Dict[str, Any]) -> Dict[str, Any]:
         logger.error(f"Error processing record: {str(e)}")
         raise e
 
+def enrich_record(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate the incoming data record and add the derived fields
+    """
+    # Add processing timestamp
+    data['processed_at'] = datetime.utcnow().isoformat()
+    
+    # Perform data validation
+    validate_data(data)
+    
+    # Enrich data with additional fields
+    data['session_duration'] = calculate_session_duration(data)
+    data['user_segment'] = determine_user_segment(data)
+    
+    return data
+
 def validate_data(data: Dict[str, Any]) -> None:
     """
     Validate the incoming data record
     """
-    required_fields = ['timestamp', 'user_id', 'event_type']
-    
-    for field in required_fields:
-        if field not in data:
-            raise ValueError(f"Missing required field: {field}")
+    if not REQUIRED_FIELD_SET <= data.keys():
+        missing = next(field for field in REQUIRED_FIELDS if field not in data)
+        raise ValueError(f"Missing required field: {missing}")
     
     # Validate timestamp format
     try:
         datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-    except ValueError:
+    except (AttributeError, ValueError):
         raise ValueError("Invalid timestamp format")
     
+    # Validate user_id
+    if not isinstance(data['user_id'], str) or not data['user_id']:
+        raise ValueError("Invalid user_id: expected a non-empty string")
+    
     # Validate event_type
-    valid_event_types = ['view', 'click', 'purchase', 'signup', 'login', 'logout']
-    if data['event_type'] not in valid_event_types:
+    if not isinstance(data['event_type'], str) or data['event_type'] not in VALID_EVENT_TYPES:
         raise ValueError(f"Invalid event_type: {data['event_type']}")
+    
+    # Validate numeric fields
+    for field in NUMERIC_FIELDS:
+        if field in data and (isinstance(data[field], bool) or not isinstance(data[field], (int, float))):
+            raise ValueError(f"Invalid {field}: expected a number")
 
 def calculate_session_duration(data: Dict[str, Any]) -> int:
     """
@@ -160,82 +408,216 @@ def extract_ml_features(data: Dict[str, Any]) -> List[float]:
     ]
     return features
 
+def encode_features(features_batch: List[List[float]]) -> Tuple[str, bytes]:
+    """
+    Serialize a batch of feature vectors for the SageMaker endpoint, as a single
+    float32 .npy matrix when numpy is available and as JSON instances otherwise
+    """
+    if np is None:
+        return 'application/json', json_bytes({'instances': features_batch})
+    
+    buffer = io.BytesIO()
+    np.save(buffer, np.array(features_batch, dtype=np.float32))
+    return 'application/x-npy', buffer.getvalue()
+
 def get_ml_prediction(features: List[float]) -> Dict[str, Any]:
     """
     Get ML prediction from SageMaker endpoint
     """
+    return get_ml_predictions([features])[0]
+
+def get_ml_predictions(features_batch: List[List[float]]) -> List[Dict[str, Any]]:
+    """
+    Get ML predictions for several feature vectors, in-process when a local
+    model is configured and otherwise with one SageMaker request
+    """
     try:
-        payload = json.dumps({
-            'instances': [features]
-        })
+        model_package = get_local_model()
+        if model_package is not None:
+            return predict_locally(model_package, features_batch)
+        
+        content_type, payload = encode_features(features_batch)
         
-        response = sagemaker_client.invoke_endpoint(
+        response = get_sagemaker_client().invoke_endpoint(
             EndpointName=SAGEMAKER_ENDPOINT,
-            ContentType='application/json',
+            ContentType=content_type,
+            Accept='application/json',
             Body=payload
         )
         
-        result = json.loads(response['Body'].read().decode())
-        return result
+        result = json_loads(response['Body'].read().decode())
+        predictions = result['predictions']
+        if len(predictions) != len(features_batch):
+            raise ValueError(f"Expected {len(features_batch)} predictions, got {len(predictions)}")
+        return predictions
         
     except Exception as e:
         logger.error(f"Error getting ML prediction: {str(e)}")
-        return {'prediction': 0.0, 'confidence': 0.0}
+        return [{'prediction': 0.0, 'confidence': 0.0} for _ in features_batch]
 
-def store_in_redshift(data: Dict[str, Any]) -> None:
+def predict_locally(model_package: Dict[str, Any], features_batch: List[List[float]]) -> List[Dict[str, Any]]:
     """
-    Store processed data in Redshift
+    Score a batch with the in-process model, matching the endpoint's response format
+    """
+    X = model_package['scaler'].transform(np.array(features_batch, dtype=np.float32))
+    predictions = model_package['model'].predict(X)
+    probabilities = model_package['model'].predict_proba(X)
+    
+    return [
+        {
+            'prediction': int(prediction),
+            'probability': float(probability[1]),
+            'confidence': float(max(probability))
+        }
+        for prediction, probability in zip(predictions, probabilities)
+    ]
+
+def build_row_parameters(data: Dict[str, Any], row: int) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Build the VALUES placeholder and the Data API parameters for one processed
+    record at the given row index. The Data API rejects empty parameter values,
+    so missing and empty values are written as NULL literals instead.
+    """
+    values = (
+        data['timestamp'],
+        data['user_id'],
+        data['event_type'],
+        data.get('value', 0),
+        data.get('session_duration', 0),
+        data.get('user_segment', 'unknown'),
+        json_dumps(data.get('ml_prediction', {})),
+        data['processed_at']
+    )
+    placeholders = []
+    parameters = []
+    for column, value in zip(REDSHIFT_COLUMNS, values):
+        if value is None or value == '':
+            placeholders.append('NULL')
+        else:
+            placeholders.append(f":{column}_{row}")
+            parameters.append({'name': f"{column}_{row}", 'value': str(value)})
+    return '(' + ', '.join(placeholders) + ')', parameters
+
+def insert_redshift_rows(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insert rows with one statement, splitting the batch in half on failure until
+    the rows that cannot be stored are isolated, and return those rows
     """
     try:
-        # Create SQL statement
-        sql = f"""
-        INSERT INTO events (
-            timestamp, user_id, event_type, value, 
-            session_duration, user_segment, ml_prediction, processed_at
-        ) VALUES (
-            '{data['timestamp']}', 
-            '{data['user_id']}', 
-            '{data['event_type']}', 
-            {data.get('value', 0)},
-            {data.get('session_duration', 0)},
-            '{data.get('user_segment', 'unknown')}',
-            '{json.dumps(data.get('ml_prediction', {}))}',
-            '{data['processed_at']}'
-        );
-        """
+        # Bind every row's values as parameters of one statement
+        placeholders = []
+        parameters = []
+        for row, data in enumerate(batch):
+            placeholder, row_parameters = build_row_parameters(data, row)
+            placeholders.append(placeholder)
+            parameters.extend(row_parameters)
         
         # Execute SQL
         response = redshift_client.execute_statement(
             ClusterIdentifier=REDSHIFT_CLUSTER_ID,
             Database=REDSHIFT_DATABASE,
-            Sql=sql
+            Sql=REDSHIFT_INSERT_SQL + ', '.join(placeholders),
+            Parameters=parameters
         )
         
-        logger.info(f"Stored record in Redshift: {response['Id']}")
+        logger.info(f"Stored {len(batch)} records in Redshift: {response['Id']}")
+        return []
         
     except Exception as e:
-        logger.error(f"Error storing in Redshift: {str(e)}")
-        raise e
+        logger.error(f"Error storing {len(batch)} records in Redshift: {str(e)}")
+        if len(batch) == 1:
+            return batch
+        
+        middle = len(batch) // 2
+        return insert_redshift_rows(batch[:middle]) + insert_redshift_rows(batch[middle:])
 
-def store_in_s3(data: Dict[str, Any]) -> None:
+def store_in_redshift(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Store processed data in S3 data lake
+    Store processed records in Redshift, one INSERT per batch of rows, and
+    return the records that could not be stored
+    """
+    failed_rows = []
+    for start in range(0, len(records), REDSHIFT_BATCH_SIZE):
+        failed_rows.extend(insert_redshift_rows(records[start:start + REDSHIFT_BATCH_SIZE]))
+    
+    if failed_rows:
+        logger.warning(f"Failed to store {len(failed_rows)} records in Redshift")
+    return failed_rows
+
+def s3_object_exists(s3_key: str) -> bool:
+    """
+    Check whether an object exists in the data lake bucket with a HEAD request
     """
     try:
-        # Create S3 key with partitioning
+        s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def store_in_s3(records: List[Dict[str, Any]], batch_id: str) -> List[Dict[str, Any]]:
+    """
+    Store processed records in the S3 data lake, one gzipped newline-delimited
+    JSON object per hourly partition, and return the records of the partitions
+    that could not be stored
+    """
+    # Group records by their hourly partition
+    partitions = {}
+    for data in records:
         timestamp = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-        s3_key = f"events/year={timestamp.year}/month={timestamp.month:02d}/day={timestamp.day:02d}/hour={timestamp.hour:02d}/{data['user_id']}_{timestamp.isoformat()}.json"
-        
-        # Upload to S3
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=json.dumps(data),
-            ContentType='application/json'
-        )
-        
-        logger.info(f"Stored record in S3: {s3_key}")
+        partition = (timestamp.year, timestamp.month, timestamp.day, timestamp.hour)
+        partitions.setdefault(partition, []).append(data)
+    
+    failed_rows = []
+    for partition, rows in partitions.items():
+        try:
+            # Keyed by the batch's first sequence number, so a retried batch maps to the same objects
+            s3_key = EVENTS_PREFIX_TEMPLATE.format(*partition) + batch_id + '.jsonl.gz'
+            
+            # Level 1 keeps most of the size reduction at a fraction of the CPU cost
+            body = gzip.compress(b'\n'.join(json_bytes(data) for data in rows), compresslevel=1)
+            
+            # Upload to S3 unless a retry of this batch already stored the partition;
+            # large partitions go through the transfer manager in parallel parts
+            conditional_put = S3_CONDITIONAL_WRITES and len(body) <= S3_MULTIPART_THRESHOLD
+            
+            # Multipart uploads are only checked on completion, so probe first
+            if not conditional_put and s3_object_exists(s3_key):
+                logger.info(f"Skipping {s3_key}, already stored in S3")
+                continue
+            
+            if len(body) > S3_MULTIPART_THRESHOLD:
+                s3_client.upload_fileobj(
+                    io.BytesIO(body),
+                    S3_BUCKET,
+                    s3_key,
+                    ExtraArgs={'ContentType': 'application/x-ndjson', 'ContentEncoding': 'gzip'},
+                    Config=S3_TRANSFER_CONFIG
+                )
+            else:
+                put_args = {
+                    'Bucket': S3_BUCKET,
+                    'Key': s3_key,
+                    'Body': body,
+                    'ContentType': 'application/x-ndjson',
+                    'ContentEncoding': 'gzip'
+                }
+                if conditional_put:
+                    put_args['IfNoneMatch'] = '*'
+                
+                try:
+                    s3_client.put_object(**put_args)
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'PreconditionFailed':
+                        raise
+                    logger.info(f"Skipping {s3_key}, already stored in S3")
+                    continue
+            
+            logger.info(f"Stored {len(rows)} records in S3: {s3_key}")
         
-    except Exception as e:
-        logger.error(f"Error storing in S3: {str(e)}")
-        raise e
+        except Exception as e:
+            logger.error(f"Error storing partition {partition} in S3: {str(e)}")
+            failed_rows.extend(rows)
+    
+    return failed_rows
@@ -196,6 +196,7 @@ class SimpleMLModel:
         
         # Create inference script
         inference_script = """
+import io
 import json
 import joblib
 import numpy as np
@@ -208,6 +209,9 @@ def input_fn(request_body, request_content_type):
     if request_content_type == 'application/json':
         input_data = json.loads(request_body)
         return input_data
+    elif request_content_type == 'application/x-npy':
+        # A float32 feature matrix, one row per instance
+        return {'instances': np.load(io.BytesIO(request_body))}
     else:
         raise ValueError(f"Unsupported content type: {request_content_type}")
 
@@ -215,27 +219,31 @@ def predict_fn(input_data, model):
     model_obj = model['model']
     scaler = model['scaler']
     
-    # Extract features
+    # Extract features; a request may carry several instances
     if 'instances' in input_data:
-        features = input_data['instances'][0]
+        X = np.array(input_data['instances'])
     else:
-        features = input_data
-    
-    # Convert to numpy array and reshape
-    X = np.array(features).reshape(1, -1)
+        X = np.array(input_data).reshape(1, -1)
     
     # Scale features
     X_scaled = scaler.transform(X)
     
-    # Make prediction
-    prediction = model_obj.predict(X_scaled)[0]
-    probability = model_obj.predict_proba(X_scaled)[0]
+    # Score all instances in one call
+    predictions = model_obj.predict(X_scaled)
+    probabilities = model_obj.predict_proba(X_scaled)
     
-    return {
-        'prediction': int(prediction),
-        'probability': float(probability[1]),
-        'confidence': float(max(probability))
-    }
+    results = [
+        {
+            'prediction': int(prediction),
+            'probability': float(probability[1]),
+            'confidence': float(max(probability))
+        }
+        for prediction, probability in zip(predictions, probabilities)
+    ]
+    
+    if 'instances' in input_data:
+        return {'predictions': results}
+    return results[0]
 
 def output_fn(prediction, content_type):
     if content_type == 'application/json':
@@ -9,6 +9,7 @@ from unittest.mock import Mock, patch, MagicMock
 from moto import mock_kinesis, mock_s3, mock_redshift, mock_sagemaker
 import base64
 from datetime import datetime
+from botocore.exceptions import ClientError
 
 # Import the function to test
 import sys
@@ -22,6 +23,7 @@ from data_processor import (
     determine_user_segment,
     extract_ml_features,
     get_ml_prediction,
+    send_to_dlq,
     store_in_redshift,
     store_in_s3
 )
@@ -68,9 +70,9 @@ class TestDataProcessor:
         }):
             with patch('data_processor.store_in_redshift') as mock_redshift, \
                  patch('data_processor.store_in_s3') as mock_s3, \
-                 patch('data_processor.get_ml_prediction') as mock_ml:
+                 patch('data_processor.get_ml_predictions') as mock_ml:
                 
-                mock_ml.return_value = {'prediction': 0.8, 'confidence': 0.9}
+                mock_ml.return_value = [{'prediction': 0.8, 'confidence': 0.9}]
                 
                 result = lambda_handler(self.sample_event, None)
                 
@@ -79,6 +81,7 @@ class TestDataProcessor:
                 assert body['processed'] == 1
                 assert body['failed'] == 0
                 assert len(body['processed_records']) == 1
+                mock_ml.assert_called_once()
 
     def test_lambda_handler_invalid_data(self):
         """Test lambda handler with invalid data"""
@@ -108,6 +111,91 @@ class TestDataProcessor:
             assert body['processed'] == 0
             assert body['failed'] == 1
 
+    def test_lambda_handler_dead_letters_invalid_data(self):
+        """Test lambda handler sends invalid records to the dead-letter queue"""
+        invalid_event = {
+            "Records": [
+                {
+                    "kinesis": {
+                        "data": base64.b64encode(json.dumps({
+                            "invalid": "data"
+                        }).encode()).decode(),
+                        "sequenceNumber": "1234567890"
+                    }
+                }
+            ]
+        }
+        
+        with patch('data_processor.DLQ_URL', 'https://sqs.us-east-1.amazonaws.com/123456789012/dlq'), \
+             patch('data_processor.get_sqs_client') as mock_get_client:
+            mock_sqs = mock_get_client.return_value
+            mock_sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+            
+            result = lambda_handler(invalid_event, None)
+            
+            assert result['statusCode'] == 200
+            body = json.loads(result['body'])
+            assert body['processed'] == 0
+            assert body['failed'] == 0
+            assert body['dead_lettered'] == 1
+            
+            entries = mock_sqs.send_message_batch.call_args.kwargs['Entries']
+            message = json.loads(entries[0]['MessageBody'])
+            assert message['sequenceNumber'] == "1234567890"
+            assert message['data'] == invalid_event['Records'][0]['kinesis']['data']
+            assert message['truncated'] is False
+            assert 'Missing required field' in message['error']
+
+    def test_send_to_dlq_limits_batch_size(self):
+        """Test that dead-letter batches stay within the SQS request size limit"""
+        large_data = base64.b64encode(b'x' * 1024 * 1024).decode()
+        invalid_records = [
+            ({"kinesis": {"data": large_data, "sequenceNumber": str(i)}}, ValueError("Invalid"))
+            for i in range(40)
+        ]
+
+        with patch('data_processor.DLQ_URL', 'https://sqs.us-east-1.amazonaws.com/123456789012/dlq'), \
+             patch('data_processor.get_sqs_client') as mock_get_client:
+            mock_sqs = mock_get_client.return_value
+            mock_sqs.send_message_batch.side_effect = lambda **kwargs: {
+                'Successful': [{'Id': entry['Id']} for entry in kwargs['Entries']]
+            }
+
+            assert len(send_to_dlq(invalid_records)) == 40
+
+        for call in mock_sqs.send_message_batch.call_args_list:
+            entries = call.kwargs['Entries']
+            assert len(entries) <= 10
+            assert sum(len(entry['MessageBody'].encode()) for entry in entries) <= 256 * 1024
+            assert json.loads(entries[0]['MessageBody'])['truncated'] is True
+
+    def test_lambda_handler_dead_letters_non_object_payload(self):
+        """Test lambda handler treats a non-object JSON payload as invalid data"""
+        array_event = {
+            "Records": [
+                {
+                    "kinesis": {
+                        "data": base64.b64encode(json.dumps([1, 2, 3]).encode()).decode(),
+                        "sequenceNumber": "1234567890"
+                    }
+                }
+            ]
+        }
+        
+        with patch('data_processor.DLQ_URL', 'https://sqs.us-east-1.amazonaws.com/123456789012/dlq'), \
+             patch('data_processor.get_sqs_client') as mock_get_client:
+            mock_sqs = mock_get_client.return_value
+            mock_sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+            
+            result = lambda_handler(array_event, None)
+            
+            body = json.loads(result['body'])
+            assert body['failed'] == 0
+            assert body['dead_lettered'] == 1
+            
+            entries = mock_sqs.send_message_batch.call_args.kwargs['Entries']
+            assert 'Expected a JSON object' in json.loads(entries[0]['MessageBody'])['error']
+
     def test_process_record_success(self):
         """Test successful record processing"""
         with patch('data_processor.validate_data') as mock_validate, \
@@ -163,6 +251,14 @@ class TestDataProcessor:
         with pytest.raises(ValueError, match="Invalid event_type"):
             validate_data(invalid_data)
 
+    def test_validate_data_invalid_types(self):
+        """Test data validation with wrongly typed fields"""
+        for field, value in (("user_id", ""), ("user_id", 42), ("value", ""), ("value", None), ("session_duration", True)):
+            invalid_data = dict(self.sample_data, **{field: value})
+            
+            with pytest.raises(ValueError, match=f"Invalid {field}"):
+                validate_data(invalid_data)
+
     def test_calculate_session_duration(self):
         """Test session duration calculation"""
         # Test login event
@@ -208,9 +304,10 @@ class TestDataProcessor:
         assert features[2] == 1.0  # is_purchase
         assert features[3] == 1.0  # is_high_value
 
-    @patch('data_processor.sagemaker_client')
-    def test_get_ml_prediction_success(self, mock_sagemaker):
+    @patch('data_processor.get_sagemaker_client')
+    def test_get_ml_prediction_success(self, mock_get_client):
         """Test successful ML prediction"""
+        mock_sagemaker = mock_get_client.return_value
         mock_response = {
             'Body': Mock()
         }
@@ -225,9 +322,10 @@ class TestDataProcessor:
             assert result['prediction'] == 0.8
             assert result['confidence'] == 0.9
 
-    @patch('data_processor.sagemaker_client')
-    def test_get_ml_prediction_error(self, mock_sagemaker):
+    @patch('data_processor.get_sagemaker_client')
+    def test_get_ml_prediction_error(self, mock_get_client):
         """Test ML prediction with error"""
+        mock_sagemaker = mock_get_client.return_value
         mock_sagemaker.invoke_endpoint.side_effect = Exception("SageMaker error")
         
         with patch.dict(os.environ, {'SAGEMAKER_ENDPOINT': 'test-endpoint'}):
@@ -236,6 +334,21 @@ class TestDataProcessor:
             assert result['prediction'] == 0.0
             assert result['confidence'] == 0.0
 
+    @patch('data_processor.get_sagemaker_client')
+    @patch('data_processor.get_local_model')
+    def test_get_ml_prediction_local_model(self, mock_get_model, mock_get_client):
+        """Test ML prediction with an in-process model package"""
+        model_package = {'model': Mock(), 'scaler': Mock()}
+        model_package['scaler'].transform.side_effect = lambda X: X
+        model_package['model'].predict.return_value = [1]
+        model_package['model'].predict_proba.return_value = [[0.2, 0.8]]
+        mock_get_model.return_value = model_package
+        
+        result = get_ml_prediction([0.5, 0.3, 0.8, 0.2])
+        
+        assert result == {'prediction': 1, 'probability': 0.8, 'confidence': 0.8}
+        mock_get_client.assert_not_called()
+
     @patch('data_processor.redshift_client')
     def test_store_in_redshift_success(self, mock_redshift):
         """Test successful Redshift storage"""
@@ -245,7 +358,7 @@ class TestDataProcessor:
             'REDSHIFT_CLUSTER_ID': 'test-cluster',
             'REDSHIFT_DATABASE': 'analytics'
         }):
-            store_in_redshift(self.sample_data)
+            store_in_redshift([self.sample_data])
             mock_redshift.execute_statement.assert_called_once()
 
     @patch('data_processor.redshift_client')
@@ -257,24 +370,150 @@ class TestDataProcessor:
             'REDSHIFT_CLUSTER_ID': 'test-cluster',
             'REDSHIFT_DATABASE': 'analytics'
         }):
-            with pytest.raises(Exception, match="Redshift error"):
-                store_in_redshift(self.sample_data)
+            assert store_in_redshift([self.sample_data]) == [self.sample_data]
+
+    @patch('data_processor.redshift_client')
+    def test_store_in_redshift_isolates_failed_rows(self, mock_redshift):
+        """Test that a failed INSERT is split until only the bad row is left"""
+        records = [
+            dict(self.sample_data, user_id=f"user_{i:06d}", processed_at="2024-01-15T10:00:01")
+            for i in range(4)
+        ]
+
+        def execute_statement(**kwargs):
+            if any(parameter['value'] == 'user_000002' for parameter in kwargs['Parameters']):
+                raise Exception("Redshift error")
+            return {'Id': 'test-id'}
+
+        mock_redshift.execute_statement.side_effect = execute_statement
+
+        assert store_in_redshift(records) == [records[2]]
+
+    @patch('data_processor.redshift_client')
+    def test_store_in_redshift_batches_rows(self, mock_redshift):
+        """Test that a batch of records is stored with a single INSERT"""
+        mock_redshift.execute_statement.return_value = {'Id': 'test-id'}
+        records = [
+            dict(self.sample_data, user_id=f"user_{i:06d}", processed_at="2024-01-15T10:00:01")
+            for i in range(3)
+        ]
+
+        store_in_redshift(records)
+
+        mock_redshift.execute_statement.assert_called_once()
+        call = mock_redshift.execute_statement.call_args.kwargs
+        assert call['Sql'].count('(:timestamp_') == 3
+        assert {'name': 'user_id_2', 'value': 'user_000002'} in call['Parameters']
+
+    @patch('data_processor.redshift_client')
+    def test_store_in_redshift_writes_empty_values_as_null(self, mock_redshift):
+        """Test that empty and missing values are not bound as empty parameters"""
+        mock_redshift.execute_statement.return_value = {'Id': 'test-id'}
+        record = dict(self.sample_data, user_segment="", session_duration=None, processed_at="2024-01-15T10:00:01")
+
+        store_in_redshift([record])
+
+        call = mock_redshift.execute_statement.call_args.kwargs
+        assert ':user_segment_0' not in call['Sql']
+        assert ':session_duration_0' not in call['Sql']
+        assert call['Sql'].count('NULL') == 2
+        assert all(parameter['value'] for parameter in call['Parameters'])
 
     @patch('data_processor.s3_client')
     def test_store_in_s3_success(self, mock_s3):
         """Test successful S3 storage"""
         with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}):
-            store_in_s3(self.sample_data)
+            store_in_s3([self.sample_data], '1234567890')
             mock_s3.put_object.assert_called_once()
 
+    @patch('data_processor.s3_client')
+    def test_store_in_s3_groups_by_partition(self, mock_s3):
+        """Test that records are written as one object per hourly partition"""
+        records = [
+            self.sample_data,
+            dict(self.sample_data, user_id="user_000002"),
+            dict(self.sample_data, timestamp="2024-01-15T11:30:00Z")
+        ]
+
+        with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}):
+            store_in_s3(records, '1234567890')
+
+        assert mock_s3.put_object.call_count == 2
+        keys = sorted(call.kwargs['Key'] for call in mock_s3.put_object.call_args_list)
+        assert keys[0] == "events/year=2024/month=01/day=15/hour=10/1234567890.jsonl.gz"
+        assert keys[1] == "events/year=2024/month=01/day=15/hour=11/1234567890.jsonl.gz"
+
+    @patch('data_processor.s3_client')
+    def test_store_in_s3_large_partition_uses_multipart(self, mock_s3):
+        """Test that partitions above the multipart threshold use the transfer manager"""
+        mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+
+        with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}), \
+             patch('data_processor.S3_MULTIPART_THRESHOLD', 16):
+            store_in_s3([self.sample_data], '1234567890')
+
+        mock_s3.put_object.assert_not_called()
+        mock_s3.upload_fileobj.assert_called_once()
+        assert mock_s3.upload_fileobj.call_args.kwargs['ExtraArgs']['ContentEncoding'] == 'gzip'
+
+    @patch('data_processor.s3_client')
+    def test_store_in_s3_skips_existing_objects(self, mock_s3):
+        """Test that partitions stored by an earlier attempt are not uploaded again"""
+        mock_s3.put_object.side_effect = ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+
+        with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}):
+            store_in_s3([self.sample_data], '1234567890')
+
+        assert mock_s3.put_object.call_args.kwargs['IfNoneMatch'] == '*'
+
+    @patch('data_processor.s3_client')
+    def test_store_in_s3_probes_without_conditional_writes(self, mock_s3):
+        """Test that runtimes without conditional writes check for the object first"""
+        mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+
+        with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}), \
+             patch('data_processor.S3_CONDITIONAL_WRITES', False):
+            store_in_s3([self.sample_data], '1234567890')
+
+        mock_s3.head_object.assert_called_once()
+        assert 'IfNoneMatch' not in mock_s3.put_object.call_args.kwargs
+
     @patch('data_processor.s3_client')
     def test_store_in_s3_error(self, mock_s3):
         """Test S3 storage with error"""
         mock_s3.put_object.side_effect = Exception("S3 error")
         
         with patch.dict(os.environ, {'S3_BUCKET': 'test-bucket'}):
-            with pytest.raises(Exception, match="S3 error"):
-                store_in_s3(self.sample_data)
+            assert store_in_s3([self.sample_data], '1234567890') == [self.sample_data]
+
+    def test_lambda_handler_reports_unstored_records(self):
+        """Test that only the records that could not be stored are reported for retry"""
+        records = []
+        for i, hour in enumerate(("10", "11")):
+            records.append({
+                "kinesis": {
+                    "data": base64.b64encode(json.dumps(dict(
+                        self.sample_data, timestamp=f"2024-01-15T{hour}:00:00Z"
+                    )).encode()).decode(),
+                    "sequenceNumber": f"123456789{i}"
+                }
+            })
+
+        def put_object(**kwargs):
+            if "hour=11" in kwargs['Key']:
+                raise Exception("S3 error")
+
+        with patch('data_processor.store_in_redshift', return_value=[]), \
+             patch('data_processor.get_ml_predictions', return_value=[{}, {}]), \
+             patch('data_processor.s3_client') as mock_s3:
+            mock_s3.put_object.side_effect = put_object
+
+            result = lambda_handler({"Records": records}, None)
+
+        body = json.loads(result['body'])
+        assert body['processed_records'] == ["1234567890"]
+        assert body['failed_records'] == ["1234567891"]
+        assert result['batchItemFailures'] == [{'itemIdentifier': "1234567891"}]
 
     def test_performance_benchmarks(self):
         """Test performance benchmarks"""
@@ -302,9 +541,9 @@ class TestDataProcessor:
         }):
             with patch('data_processor.store_in_redshift'), \
                  patch('data_processor.store_in_s3'), \
-                 patch('data_processor.get_ml_prediction') as mock_ml:
+                 patch('data_processor.get_ml_predictions') as mock_ml:
                 
-                mock_ml.return_value = {'prediction': 0.8, 'confidence': 0.9}
+                mock_ml.return_value = [{'prediction': 0.8, 'confidence': 0.9}] * 100
                 lambda_handler(batch_event, None)
         
         batch_processing_time = time.time() - start_time
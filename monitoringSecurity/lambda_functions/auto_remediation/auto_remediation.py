@@ -1,69 +1,234 @@
+import os
 import json
+import re
+import time
 import boto3
 import logging
-from datetime import datetime
+from collections import defaultdict
+from botocore.config import Config
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# SNS topic for notifications, read once per container
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+if not SNS_TOPIC_ARN:
+    logger.warning("SNS_TOPIC_ARN is not set; notifications will be skipped")
+
+# Shared client configuration: larger connection pool for concurrent calls,
+# TCP keep-alive so warm invocations reuse HTTPS connections, adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
 # Initialize AWS clients
-ec2_client = boto3.client('ec2')
-cloudwatch_client = boto3.client('cloudwatch')
-sns_client = boto3.client('sns')
-ssm_client = boto3.client('ssm')
+ec2_client = boto3.client('ec2', config=BOTO_CONFIG)
+cloudwatch_client = boto3.client('cloudwatch', config=BOTO_CONFIG)
+sns_client = boto3.client('sns', config=BOTO_CONFIG)
+ssm_client = boto3.client('ssm', config=BOTO_CONFIG)
+
+# EC2 instance IDs embedded in alarm names/reasons (ASCII-only charset)
+INSTANCE_ID_PATTERN = re.compile(r'i-[a-f0-9]+', re.ASCII)
+
+# SSM SendCommand accepts at most 50 instance IDs per request
+SSM_MAX_INSTANCES = 50
+
+# Remediations run through AWS-RunShellScript, keyed by alarm-name substring
+SSM_REMEDIATIONS = {
+    'high-cpu': {
+        'commands': [
+            'sudo systemctl restart httpd',
+            'sudo systemctl status httpd'
+        ],
+        'running_only': True,
+        'success': "Restarted Apache service on instance {instance_id}",
+        'failure': "Failed to restart service on instance {instance_id}: {error}",
+        'manual': "High CPU alarm processed - manual intervention may be required"
+    },
+    'high-memory': {
+        'commands': [
+            'sudo sync',
+            'sudo echo 3 > /proc/sys/vm/drop_caches',
+            'free -h'
+        ],
+        'running_only': False,
+        'success': "Cleared system cache on instance {instance_id}",
+        'failure': "Failed to clear cache on instance {instance_id}: {error}",
+        'manual': "High memory alarm processed - manual intervention may be required"
+    },
+    'disk-space': {
+        'commands': [
+            'sudo find /var/log -name "*.log" -type f -mtime +7 -delete',
+            'sudo find /tmp -type f -mtime +1 -delete',
+            'sudo yum clean all',
+            'df -h'
+        ],
+        'running_only': False,
+        'success': "Cleaned up disk space on instance {instance_id}",
+        'failure': "Failed to clean disk on instance {instance_id}: {error}",
+        'manual': "Disk space alarm processed - manual intervention may be required"
+    }
+}
+
+# Prebuilt JSON response bodies; only the variable values are serialized per call
+OK_BODY_TEMPLATE = '{"message": "Auto-remediation completed", "alarm": %s, "action": %s}'
+ERROR_BODY_TEMPLATE = '{"error": %s}'
+
+# SNS PublishBatch accepts at most 10 entries per request
+SNS_BATCH_SIZE = 10
+SNS_BATCH_MAX_ATTEMPTS = 3
+
+def json_dumps(obj, default=None):
+    """Serialize to a JSON string, using orjson when it is available"""
+    if orjson:
+        return orjson.dumps(obj, default=default).decode()
+    return json.dumps(obj, default=default)
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when it is available"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class LazyJson:
+    """Defer JSON serialization of a log argument until the record is emitted"""
+    
+    def __init__(self, obj):
+        self.obj = obj
+    
+    def __str__(self):
+        return json_dumps(self.obj, default=str)
 
 def handler(event, context):
     """
     Auto-remediation Lambda function for CloudWatch alarms
     """
-    logger.info(f"Received event: {json.dumps(event)}")
+    logger.info("Received event: %s", LazyJson(event))
     
     try:
-        # Parse the CloudWatch alarm event
-        alarm_name = event['detail']['alarmName']
-        alarm_state = event['detail']['state']['value']
-        alarm_reason = event['detail']['state']['reason']
-        
-        logger.info(f"Processing alarm: {alarm_name}, State: {alarm_state}")
-        
-        # Get SNS topic ARN from environment
-        sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
+        # Alarm events delivered in batches (e.g. through SQS)
+        records = event.get('Records')
+        if records:
+            return handle_alarm_batch(records, SNS_TOPIC_ARN)
         
-        # Determine remediation action based on alarm name
-        if 'high-cpu' in alarm_name.lower():
-            result = handle_high_cpu_alarm(alarm_name, alarm_reason)
-        elif 'high-memory' in alarm_name.lower():
-            result = handle_high_memory_alarm(alarm_name, alarm_reason)
-        elif 'disk-space' in alarm_name.lower():
-            result = handle_disk_space_alarm(alarm_name, alarm_reason)
-        elif 'instance-status' in alarm_name.lower():
-            result = handle_instance_status_alarm(alarm_name, alarm_reason)
-        else:
-            result = handle_generic_alarm(alarm_name, alarm_reason)
+        alarm_name, alarm_state, result = process_alarm(event)
         
         # Send notification
-        if sns_topic_arn:
-            send_notification(sns_topic_arn, alarm_name, alarm_state, result)
+        if SNS_TOPIC_ARN:
+            send_notification(SNS_TOPIC_ARN, alarm_name, alarm_state, result)
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Auto-remediation completed',
-                'alarm': alarm_name,
-                'action': result
-            })
+            'body': OK_BODY_TEMPLATE % (json_dumps(alarm_name), json_dumps(result))
         }
         
     except Exception as e:
         logger.error(f"Error in auto-remediation: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
-                'error': str(e)
-            })
+            'body': ERROR_BODY_TEMPLATE % json_dumps(str(e))
         }
 
+def handle_alarm_batch(records, sns_topic_arn):
+    """
+    Remediate a batch of alarm events and send a single batched notification,
+    reporting the records that could not be remediated as batch item failures
+    """
+    processed = []
+    failed_message_ids = []
+    
+    # SSM remediations are grouped by action so each one is sent once per 50 instances
+    ssm_alarms = defaultdict(list)
+    
+    for record in records:
+        message_id = record.get('messageId')
+        try:
+            alarm_name, alarm_state, alarm_reason = parse_alarm(json_loads(record['body']))
+            token = match_alarm_token(alarm_name)
+            instance_id = extract_instance_id(alarm_name, alarm_reason)
+            
+            if token in SSM_REMEDIATIONS and instance_id:
+                ssm_alarms[token].append((alarm_name, alarm_state, instance_id, message_id))
+            else:
+                alarm_handler = ALARM_HANDLERS.get(token, handle_generic_alarm)
+                processed.append((alarm_name, alarm_state, alarm_handler(alarm_name, alarm_reason)))
+        except Exception as e:
+            logger.error(f"Failed to process alarm record {message_id}: {str(e)}")
+            processed.append((f"Alarm record {message_id}", 'UNKNOWN', f"Remediation failed: {str(e)}"))
+            failed_message_ids.append(message_id)
+    
+    for token, alarms in ssm_alarms.items():
+        try:
+            results = run_ssm_remediation(token, [instance_id for _, _, instance_id, _ in alarms])
+        except Exception as e:
+            logger.error(f"Failed to run {token} remediation: {str(e)}")
+            processed.extend(
+                (alarm_name, alarm_state, f"Remediation failed: {str(e)}")
+                for alarm_name, alarm_state, _, _ in alarms
+            )
+            failed_message_ids.extend(message_id for _, _, _, message_id in alarms)
+            continue
+        
+        processed.extend(
+            (alarm_name, alarm_state, results[instance_id])
+            for alarm_name, alarm_state, instance_id, _ in alarms
+        )
+    
+    if sns_topic_arn and processed:
+        send_notification_batch(sns_topic_arn, processed)
+    
+    return {
+        'statusCode': 200,
+        'body': json_dumps({
+            'message': 'Auto-remediation completed',
+            'results': [
+                {'alarm': alarm_name, 'action': result}
+                for alarm_name, _, result in processed
+            ]
+        }),
+        # Partial batch response, so an SQS trigger redelivers only the failed records
+        'batchItemFailures': [
+            {'itemIdentifier': message_id} for message_id in failed_message_ids
+        ]
+    }
+
+def parse_alarm(event):
+    """Extract the alarm name, state and reason from a CloudWatch alarm event"""
+    alarm_name = event['detail']['alarmName']
+    alarm_state = event['detail']['state']['value']
+    alarm_reason = event['detail']['state']['reason']
+    
+    logger.info(f"Processing alarm: {alarm_name}, State: {alarm_state}")
+    
+    return alarm_name, alarm_state, alarm_reason
+
+def match_alarm_token(alarm_name):
+    """Return the first ALARM_HANDLERS key contained in the alarm name, if any"""
+    name_lc = alarm_name.lower()
+    for token in ALARM_HANDLERS:
+        if token in name_lc:
+            return token
+    return None
+
+def process_alarm(event):
+    """Parse a CloudWatch alarm event and run the matching remediation"""
+    alarm_name, alarm_state, alarm_reason = parse_alarm(event)
+    
+    # Determine remediation action based on alarm name
+    alarm_handler = ALARM_HANDLERS.get(match_alarm_token(alarm_name), handle_generic_alarm)
+    result = alarm_handler(alarm_name, alarm_reason)
+    
+    return alarm_name, alarm_state, result
+
 def handle_high_cpu_alarm(alarm_name, alarm_reason):
     """Handle high CPU alarm"""
     logger.info("Handling high CPU alarm")
@@ -72,29 +237,10 @@ def handle_high_cpu_alarm(alarm_name, alarm_reason):
     instance_id = extract_instance_id(alarm_name, alarm_reason)
     
     if instance_id:
-        # Check if instance is running
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance = response['Reservations'][0]['Instances'][0]
-        
-        if instance['State']['Name'] == 'running':
-            # Try to restart the application service
-            try:
-                ssm_client.send_command(
-                    InstanceIds=[instance_id],
-                    DocumentName="AWS-RunShellScript",
-                    Parameters={
-                        'commands': [
-                            'sudo systemctl restart httpd',
-                            'sudo systemctl status httpd'
-                        ]
-                    }
-                )
-                return f"Restarted Apache service on instance {instance_id}"
-            except Exception as e:
-                logger.error(f"Failed to restart service: {str(e)}")
-                return f"Failed to restart service on instance {instance_id}: {str(e)}"
+        # Restart the application service if the instance is running
+        return run_ssm_remediation('high-cpu', [instance_id])[instance_id]
     
-    return "High CPU alarm processed - manual intervention may be required"
+    return SSM_REMEDIATIONS['high-cpu']['manual']
 
 def handle_high_memory_alarm(alarm_name, alarm_reason):
     """Handle high memory alarm"""
@@ -103,25 +249,10 @@ def handle_high_memory_alarm(alarm_name, alarm_reason):
     instance_id = extract_instance_id(alarm_name, alarm_reason)
     
     if instance_id:
-        try:
-            # Clear system cache
-            ssm_client.send_command(
-                InstanceIds=[instance_id],
-                DocumentName="AWS-RunShellScript",
-                Parameters={
-                    'commands': [
-                        'sudo sync',
-                        'sudo echo 3 > /proc/sys/vm/drop_caches',
-                        'free -h'
-                    ]
-                }
-            )
-            return f"Cleared system cache on instance {instance_id}"
-        except Exception as e:
-            logger.error(f"Failed to clear cache: {str(e)}")
-            return f"Failed to clear cache on instance {instance_id}: {str(e)}"
+        # Clear system cache
+        return run_ssm_remediation('high-memory', [instance_id])[instance_id]
     
-    return "High memory alarm processed - manual intervention may be required"
+    return SSM_REMEDIATIONS['high-memory']['manual']
 
 def handle_disk_space_alarm(alarm_name, alarm_reason):
     """Handle disk space alarm"""
@@ -130,26 +261,58 @@ def handle_disk_space_alarm(alarm_name, alarm_reason):
     instance_id = extract_instance_id(alarm_name, alarm_reason)
     
     if instance_id:
+        # Clean up log files and temporary files
+        return run_ssm_remediation('disk-space', [instance_id])[instance_id]
+    
+    return SSM_REMEDIATIONS['disk-space']['manual']
+
+def run_ssm_remediation(token, instance_ids):
+    """
+    Run the SSM remediation for an alarm type on several instances, sending
+    one command per 50 instances, and return the action taken per instance
+    """
+    remediation = SSM_REMEDIATIONS[token]
+    instance_ids = list(dict.fromkeys(instance_ids))
+    
+    targets = instance_ids
+    if remediation['running_only']:
+        targets = get_running_instance_ids(instance_ids)
+    
+    results = {instance_id: remediation['manual'] for instance_id in instance_ids}
+    
+    for start in range(0, len(targets), SSM_MAX_INSTANCES):
+        chunk = targets[start:start + SSM_MAX_INSTANCES]
         try:
-            # Clean up log files and temporary files
             ssm_client.send_command(
-                InstanceIds=[instance_id],
+                InstanceIds=chunk,
                 DocumentName="AWS-RunShellScript",
-                Parameters={
-                    'commands': [
-                        'sudo find /var/log -name "*.log" -type f -mtime +7 -delete',
-                        'sudo find /tmp -type f -mtime +1 -delete',
-                        'sudo yum clean all',
-                        'df -h'
-                    ]
-                }
+                Parameters={'commands': remediation['commands']}
             )
-            return f"Cleaned up disk space on instance {instance_id}"
+            for instance_id in chunk:
+                results[instance_id] = remediation['success'].format(instance_id=instance_id)
         except Exception as e:
-            logger.error(f"Failed to clean disk: {str(e)}")
-            return f"Failed to clean disk on instance {instance_id}: {str(e)}"
+            logger.error(f"Failed to run {token} remediation: {str(e)}")
+            for instance_id in chunk:
+                results[instance_id] = remediation['failure'].format(instance_id=instance_id, error=str(e))
     
-    return "Disk space alarm processed - manual intervention may be required"
+    return results
+
+def get_running_instance_ids(instance_ids):
+    """Return the subset of instance IDs that are currently running"""
+    running = set()
+    
+    for start in range(0, len(instance_ids), SSM_MAX_INSTANCES):
+        response = ec2_client.describe_instances(
+            Filters=[
+                {'Name': 'instance-id', 'Values': instance_ids[start:start + SSM_MAX_INSTANCES]},
+                {'Name': 'instance-state-name', 'Values': ['running']}
+            ]
+        )
+        for reservation in response['Reservations']:
+            for instance in reservation['Instances']:
+                running.add(instance['InstanceId'])
+    
+    return [instance_id for instance_id in instance_ids if instance_id in running]
 
 def handle_instance_status_alarm(alarm_name, alarm_reason):
     """Handle instance status alarm"""
@@ -173,39 +336,39 @@ def handle_generic_alarm(alarm_name, alarm_reason):
     logger.info("Handling generic alarm")
     return f"Generic alarm processed: {alarm_name}"
 
+# Remediation handlers keyed by the alarm-name substring they respond to, in priority order
+ALARM_HANDLERS = {
+    'high-cpu': handle_high_cpu_alarm,
+    'high-memory': handle_high_memory_alarm,
+    'disk-space': handle_disk_space_alarm,
+    'instance-status': handle_instance_status_alarm,
+}
+
 def extract_instance_id(alarm_name, alarm_reason):
     """Extract instance ID from alarm name or reason"""
-    import re
-    
-    # Try to extract from alarm name
-    match = re.search(r'i-[a-f0-9]+', alarm_name)
-    if match:
-        return match.group(0)
-    
-    # Try to extract from reason
-    match = re.search(r'i-[a-f0-9]+', alarm_reason)
-    if match:
-        return match.group(0)
+    match = INSTANCE_ID_PATTERN.search(alarm_name) or INSTANCE_ID_PATTERN.search(alarm_reason)
+    return match.group(0) if match else None
+
+def build_notification(alarm_name, alarm_state, action_taken, now_iso):
+    """Build the SNS subject and structured JSON message for a remediated alarm"""
+    message = json_dumps({
+        'alarm': alarm_name,
+        'state': alarm_state,
+        'action': action_taken,
+        'ts': now_iso
+    })
     
-    return None
+    return f"Auto-Remediation: {alarm_name}", message
 
 def send_notification(sns_topic_arn, alarm_name, alarm_state, action_taken):
     """Send notification to SNS topic"""
     try:
-        message = f"""
-Auto-Remediation Alert
-
-Alarm: {alarm_name}
-State: {alarm_state}
-Action Taken: {action_taken}
-Timestamp: {datetime.now().isoformat()}
-
-This is an automated response to a CloudWatch alarm.
-        """
+        now_iso = datetime.now(timezone.utc).isoformat()
+        subject, message = build_notification(alarm_name, alarm_state, action_taken, now_iso)
         
         sns_client.publish(
             TopicArn=sns_topic_arn,
-            Subject=f"Auto-Remediation: {alarm_name}",
+            Subject=subject,
             Message=message
         )
         
@@ -213,3 +376,48 @@ This is an automated response to a CloudWatch alarm.
         
     except Exception as e:
         logger.error(f"Failed to send notification: {str(e)}")
+
+def send_notification_batch(sns_topic_arn, processed):
+    """Send notifications for several remediated alarms with SNS PublishBatch"""
+    # One timestamp for every notification in the batch
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
+    entries = []
+    for i, (alarm_name, alarm_state, action_taken) in enumerate(processed):
+        subject, message = build_notification(alarm_name, alarm_state, action_taken, now_iso)
+        entries.append({'Id': str(i), 'Subject': subject, 'Message': message})
+    
+    sent = publish_batch(sns_topic_arn, entries)
+    logger.info(f"Notifications sent for {sent} of {len(entries)} alarms")
+
+def publish_batch(sns_topic_arn, entries):
+    """Publish entries with SNS PublishBatch, retrying rejected entries, and return how many were sent"""
+    failed = 0
+    for start in range(0, len(entries), SNS_BATCH_SIZE):
+        pending = entries[start:start + SNS_BATCH_SIZE]
+        
+        attempts = 0
+        while pending and attempts < SNS_BATCH_MAX_ATTEMPTS:
+            # Back off before each retry, never after the last attempt
+            if attempts:
+                time.sleep(0.1 * 2 ** (attempts - 1))
+            attempts += 1
+            
+            try:
+                response = sns_client.publish_batch(
+                    TopicArn=sns_topic_arn,
+                    PublishBatchRequestEntries=pending
+                )
+            except Exception as e:
+                logger.error(f"Failed to send notification batch: {str(e)}")
+                break
+            
+            # Retry only the entries SNS rejected
+            failed_ids = {failure['Id'] for failure in response.get('Failed', [])}
+            pending = [entry for entry in pending if entry['Id'] in failed_ids]
+        
+        if pending:
+            logger.error(f"Failed to send {len(pending)} notifications after {attempts} attempts")
+            failed += len(pending)
+    
+    return len(entries) - failed
@@ -1,28 +1,83 @@
+import os
 import json
 import boto3
 import logging
-from datetime import datetime, timedelta
+import time
+import itertools
+import concurrent.futures
+from botocore.config import Config
+from datetime import datetime, timedelta, timezone
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# SNS topic for notifications, read once per container
+SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
+if not SNS_TOPIC_ARN:
+    logger.warning("SNS_TOPIC_ARN is not set; notifications will be skipped")
+
+# Shared client configuration: larger connection pool for concurrent calls,
+# TCP keep-alive so warm invocations reuse HTTPS connections, adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
 # Initialize AWS clients
-ec2_client = boto3.client('ec2')
-cloudwatch_client = boto3.client('cloudwatch')
-sns_client = boto3.client('sns')
-ce_client = boto3.client('ce')  # Cost Explorer
+ec2_client = boto3.client('ec2', config=BOTO_CONFIG)
+cloudwatch_client = boto3.client('cloudwatch', config=BOTO_CONFIG)
+sns_client = boto3.client('sns', config=BOTO_CONFIG)
+ce_client = boto3.client('ce', config=BOTO_CONFIG)  # Cost Explorer
+
+# Shared thread pool for I/O-bound CloudWatch lookups, reused across warm invocations
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=32)
+
+# (Namespace, MetricName) pairs used for rightsizing checks
+CPU_METRIC = ('AWS/EC2', 'CPUUtilization')
+MEMORY_METRIC = ('System/Linux', 'MemoryUtilization')
+
+# Instances averaging this much CPU or more are never considered oversized
+OVERSIZED_CPU_THRESHOLD = 20.0
+
+# GetMetricData accepts at most 500 queries per request
+MAX_METRIC_DATA_QUERIES = 500
+
+# Inventory rarely changes between scheduled runs, so describe_* results are
+# kept for 15 minutes and reused by warm invocations
+INVENTORY_CACHE_TTL = 900
+inventory_cache = {}
+
+def get_cached(key):
+    """Return a cached inventory value if it is still fresh"""
+    entry = inventory_cache.get(key)
+    if entry and time.monotonic() - entry[0] < INVENTORY_CACHE_TTL:
+        return entry[1]
+    return None
+
+def put_cached(key, value):
+    """Store an inventory value in the warm-container cache"""
+    inventory_cache[key] = (time.monotonic(), value)
+
+def json_dumps(obj, default=None):
+    """Serialize to a JSON string, using orjson when it is available"""
+    if orjson:
+        return orjson.dumps(obj, default=default).decode()
+    return json.dumps(obj, default=default)
 
 def handler(event, context):
     """
     Cost optimization Lambda function
     """
-    logger.info(f"Received event: {json.dumps(event)}")
+    logger.info(f"Received event: {json_dumps(event)}")
     
     try:
-        # Get SNS topic ARN from environment
-        sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
-        
         # Perform cost optimization checks
         optimization_results = []
         
@@ -51,12 +106,12 @@ def handler(event, context):
         
         # Send notification if optimizations are found
         if optimization_results or cost_analysis:
-            if sns_topic_arn:
-                send_cost_optimization_notification(sns_topic_arn, optimization_results, cost_analysis)
+            if SNS_TOPIC_ARN:
+                send_cost_optimization_notification(SNS_TOPIC_ARN, optimization_results, cost_analysis)
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': json_dumps({
                 'message': 'Cost optimization analysis completed',
                 'optimizations': optimization_results,
                 'cost_analysis': cost_analysis
@@ -67,7 +122,7 @@ def handler(event, context):
         logger.error(f"Error in cost optimization: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': json_dumps({
                 'error': str(e)
             })
         }
@@ -79,59 +134,33 @@ def check_idle_instances():
     idle_instances = []
     
     try:
-        # Get all running instances
-        response = ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
+        # Check CPU utilization for the last 7 days of every running instance
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=7)
+        instances, averages = get_metric_averages(
+            iter_running_instances(),
+            (CPU_METRIC,),
+            start_time,
+            end_time
         )
         
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_type = instance['InstanceType']
-                
-                # Check CPU utilization for the last 7 days
-                if is_instance_idle(instance_id):
-                    idle_instances.append(instance_id)
-                    logger.info(f"Instance {instance_id} ({instance_type}) appears to be idle")
+        for instance in instances:
+            instance_id = instance['InstanceId']
+            avg_cpu = averages.get((instance_id, CPU_METRIC))
+            
+            if avg_cpu is not None and is_instance_idle(avg_cpu):
+                idle_instances.append(instance_id)
+                logger.info(f"Instance {instance_id} ({instance['InstanceType']}) appears to be idle")
         
     except Exception as e:
         logger.error(f"Failed to check idle instances: {str(e)}")
     
     return idle_instances
 
-def is_instance_idle(instance_id):
+def is_instance_idle(avg_cpu):
     """Check if an instance is idle based on CPU utilization"""
-    try:
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
-        
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/EC2',
-            MetricName='CPUUtilization',
-            Dimensions=[
-                {'Name': 'InstanceId', 'Value': instance_id}
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,  # 1 hour
-            Statistics=['Average']
-        )
-        
-        if not response['Datapoints']:
-            return False
-        
-        # Calculate average CPU utilization
-        total_cpu = sum(point['Average'] for point in response['Datapoints'])
-        avg_cpu = total_cpu / len(response['Datapoints'])
-        
-        # Consider idle if average CPU is less than 5%
-        return avg_cpu < 5.0
-        
-    except Exception as e:
-        logger.error(f"Failed to check CPU utilization for instance {instance_id}: {str(e)}")
-        return False
+    # Consider idle if average CPU is less than 5%
+    return avg_cpu < 5.0
 
 def check_oversized_instances():
     """Check for oversized instances"""
@@ -140,82 +169,155 @@ def check_oversized_instances():
     oversized_instances = []
     
     try:
-        # Get all running instances
-        response = ec2_client.describe_instances(
-            Filters=[
-                {'Name': 'instance-state-name', 'Values': ['running']}
-            ]
+        # Fetch CPU utilization of every running instance
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=7)
+        instances, cpu_averages = get_metric_averages(
+            iter_running_instances(),
+            (CPU_METRIC,),
+            start_time,
+            end_time
         )
         
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_type = instance['InstanceType']
-                
-                # Check if instance is oversized based on CPU and memory utilization
-                if is_instance_oversized(instance_id, instance_type):
-                    oversized_instances.append(instance_id)
-                    logger.info(f"Instance {instance_id} ({instance_type}) appears to be oversized")
+        # Only instances with low CPU can be oversized, so memory is fetched for those alone
+        candidates = [
+            instance
+            for instance in instances
+            if cpu_averages.get((instance['InstanceId'], CPU_METRIC), OVERSIZED_CPU_THRESHOLD) < OVERSIZED_CPU_THRESHOLD
+        ]
+        _, memory_averages = get_metric_averages(
+            candidates,
+            (MEMORY_METRIC,),
+            start_time,
+            end_time
+        )
+        
+        for instance in candidates:
+            instance_id = instance['InstanceId']
+            avg_cpu = cpu_averages[(instance_id, CPU_METRIC)]
+            
+            # Memory utilization is only available when the CloudWatch agent is installed
+            # and its batch was fetched; otherwise the check falls back to CPU alone
+            avg_memory = memory_averages.get((instance_id, MEMORY_METRIC), 0)
+            
+            # Check if instance is oversized based on CPU and memory utilization
+            if is_instance_oversized(avg_cpu, avg_memory):
+                oversized_instances.append(instance_id)
+                logger.info(f"Instance {instance_id} ({instance['InstanceType']}) appears to be oversized")
         
     except Exception as e:
         logger.error(f"Failed to check oversized instances: {str(e)}")
     
     return oversized_instances
 
-def is_instance_oversized(instance_id, instance_type):
+def is_instance_oversized(avg_cpu, avg_memory):
     """Check if an instance is oversized"""
-    try:
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
-        
-        # Check CPU utilization
-        cpu_response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/EC2',
-            MetricName='CPUUtilization',
-            Dimensions=[
-                {'Name': 'InstanceId', 'Value': instance_id}
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Average']
-        )
-        
-        if not cpu_response['Datapoints']:
-            return False
-        
-        # Calculate average CPU utilization
-        total_cpu = sum(point['Average'] for point in cpu_response['Datapoints'])
-        avg_cpu = total_cpu / len(cpu_response['Datapoints'])
-        
-        # Check memory utilization (if available)
+    # Consider oversized if both CPU and memory are consistently low
+    return avg_cpu < OVERSIZED_CPU_THRESHOLD and avg_memory < 30.0
+
+def iter_running_instances():
+    """
+    Yield running EC2 instances page by page, or from the inventory cache
+    when a recent listing is available
+    """
+    cached = get_cached('ec2:running-instances')
+    if cached is not None:
+        yield from cached
+        return
+    
+    instances = []
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(
+        Filters=[
+            {'Name': 'instance-state-name', 'Values': ['running']}
+        ],
+        PaginationConfig={'PageSize': 1000}
+    ):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                instances.append(instance)
+                yield instance
+    
+    put_cached('ec2:running-instances', instances)
+
+def get_metric_averages(instances, metrics, start_time, end_time):
+    """
+    Get the average hourly value of each metric for every instance using
+    batched GetMetricData requests. Batches are submitted to the thread pool
+    as soon as enough instances have been read, so metric fetches overlap
+    with paging through the instances.
+    
+    Returns the consumed instances and the averages keyed by (instance_id, metric).
+    Instances of a batch that fails have no averages, like instances without data.
+    """
+    instances = iter(instances)
+    instances_per_batch = MAX_METRIC_DATA_QUERIES // len(metrics)
+    
+    consumed = []
+    futures = []
+    while True:
+        batch = list(itertools.islice(instances, instances_per_batch))
+        if not batch:
+            break
+        
+        consumed.extend(batch)
+        futures.append(executor.submit(
+            get_metric_batch_averages,
+            [(instance['InstanceId'], metric) for instance in batch for metric in metrics],
+            start_time,
+            end_time
+        ))
+    
+    averages = {}
+    for future in futures:
         try:
-            memory_response = cloudwatch_client.get_metric_statistics(
-                Namespace='System/Linux',
-                MetricName='MemoryUtilization',
-                Dimensions=[
-                    {'Name': 'InstanceId', 'Value': instance_id}
-                ],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=3600,
-                Statistics=['Average']
-            )
-            
-            if memory_response['Datapoints']:
-                total_memory = sum(point['Average'] for point in memory_response['Datapoints'])
-                avg_memory = total_memory / len(memory_response['Datapoints'])
-            else:
-                avg_memory = 0
-        except:
-            avg_memory = 0
-        
-        # Consider oversized if both CPU and memory are consistently low
-        return avg_cpu < 20.0 and avg_memory < 30.0
-        
-    except Exception as e:
-        logger.error(f"Failed to check if instance {instance_id} is oversized: {str(e)}")
-        return False
+            averages.update(future.result())
+        except Exception as e:
+            logger.error(f"Failed to get metric data batch: {str(e)}")
+    
+    return consumed, averages
+
+def get_metric_batch_averages(metrics, start_time, end_time):
+    """Run a single GetMetricData batch and average the values of each query"""
+    queries = [
+        {
+            'Id': f'm{i}',
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': namespace,
+                    'MetricName': metric_name,
+                    'Dimensions': [
+                        {'Name': 'InstanceId', 'Value': instance_id}
+                    ]
+                },
+                'Period': 3600,  # 1 hour
+                'Stat': 'Average'
+            }
+        }
+        for i, (instance_id, (namespace, metric_name)) in enumerate(metrics)
+    ]
+    
+    # Running (sum, count) per query, accumulated in a single pass over the pages
+    totals = {}
+    paginator = cloudwatch_client.get_paginator('get_metric_data')
+    for page in paginator.paginate(
+        MetricDataQueries=queries,
+        StartTime=start_time,
+        EndTime=end_time
+    ):
+        for result in page['MetricDataResults']:
+            values = result['Values']
+            if values:
+                total, count = totals.get(result['Id'], (0.0, 0))
+                totals[result['Id']] = (total + sum(values), count + len(values))
+    
+    averages = {}
+    for i, metric in enumerate(metrics):
+        if f'm{i}' in totals:
+            total, count = totals[f'm{i}']
+            averages[metric] = total / count
+    
+    return averages
 
 def check_unused_volumes():
     """Check for unused EBS volumes"""
@@ -225,34 +327,33 @@ def check_unused_volumes():
     
     try:
         # Get all available volumes
-        response = ec2_client.describe_volumes(
+        paginator = ec2_client.get_paginator('describe_volumes')
+        pages = paginator.paginate(
             Filters=[
                 {'Name': 'status', 'Values': ['available']}
-            ]
+            ],
+            PaginationConfig={'PageSize': 1000}
         )
         
-        for volume in response['Volumes']:
-            volume_id = volume['VolumeId']
-            size = volume['Size']
-            volume_type = volume['VolumeType']
-            
-            # Check if volume has been unattached for more than 7 days
-            if is_volume_unused(volume_id):
-                unused_volumes.append(volume_id)
-                logger.info(f"Volume {volume_id} ({size}GB {volume_type}) appears to be unused")
+        for page in pages:
+            for volume in page['Volumes']:
+                volume_id = volume['VolumeId']
+                size = volume['Size']
+                volume_type = volume['VolumeType']
+                
+                # Check if volume has been unattached for more than 7 days
+                if is_volume_unused(volume):
+                    unused_volumes.append(volume_id)
+                    logger.info(f"Volume {volume_id} ({size}GB {volume_type}) appears to be unused")
         
     except Exception as e:
         logger.error(f"Failed to check unused volumes: {str(e)}")
     
     return unused_volumes
 
-def is_volume_unused(volume_id):
+def is_volume_unused(volume):
     """Check if a volume has been unused for a long time"""
     try:
-        # Get volume details
-        response = ec2_client.describe_volumes(VolumeIds=[volume_id])
-        volume = response['Volumes'][0]
-        
         # Check if volume is available (not attached)
         if volume['State'] == 'available':
             # Check creation time
@@ -265,7 +366,7 @@ def is_volume_unused(volume_id):
         return False
         
     except Exception as e:
-        logger.error(f"Failed to check if volume {volume_id} is unused: {str(e)}")
+        logger.error(f"Failed to check if volume {volume['VolumeId']} is unused: {str(e)}")
         return False
 
 def check_unused_elastic_ips():
@@ -275,10 +376,13 @@ def check_unused_elastic_ips():
     unused_eips = []
     
     try:
-        # Get all Elastic IPs
-        response = ec2_client.describe_addresses()
+        # Get all Elastic IPs (DescribeAddresses is not paginated and returns every address)
+        addresses = get_cached('ec2:addresses')
+        if addresses is None:
+            addresses = ec2_client.describe_addresses()['Addresses']
+            put_cached('ec2:addresses', addresses)
         
-        for address in response['Addresses']:
+        for address in addresses:
             allocation_id = address['AllocationId']
             public_ip = address['PublicIp']
             
@@ -330,19 +434,11 @@ def get_cost_analysis():
 def send_cost_optimization_notification(sns_topic_arn, optimizations, cost_analysis):
     """Send cost optimization notification to SNS topic"""
     try:
-        message = f"""
-Cost Optimization Report
-
-Optimization Opportunities:
-{chr(10).join(f"- {opt}" for opt in optimizations) if optimizations else "No optimization opportunities found"}
-
-Cost Analysis (Current Month):
-{chr(10).join(f"- {service}: ${cost:.2f}" for service, cost in cost_analysis.items()) if cost_analysis else "Cost analysis not available"}
-
-Timestamp: {datetime.now().isoformat()}
-
-This is an automated cost optimization report.
-        """
+        message = json_dumps({
+            'optimizations': optimizations,
+            'cost_analysis': {service: round(cost, 2) for service, cost in cost_analysis.items()},
+            'ts': datetime.now(timezone.utc).isoformat()
+        })
         
         sns_client.publish(
             TopicArn=sns_topic_arn,
@@ -277,14 +277,32 @@ resource "aws_lambda_function" "broken_contact_handler" {
 # Archive files for Lambda functions
 data "archive_file" "contact_handler_zip" {
   type        = "zip"
-  source_file = "${path.module}/../lambda/contact_handler.py"
   output_path = "${path.module}/lambda_functions/contact_handler.zip"
+
+  source {
+    content  = file("${path.module}/../lambda/contact_handler.py")
+    filename = "contact_handler.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/sns_batch.py")
+    filename = "sns_batch.py"
+  }
 }
 
 data "archive_file" "broken_contact_handler_zip" {
   type        = "zip"
-  source_file = "${path.module}/../lambda/broken_contact_handler.py"
   output_path = "${path.module}/lambda_functions/broken_contact_handler.zip"
+
+  source {
+    content  = file("${path.module}/../lambda/broken_contact_handler.py")
+    filename = "broken_contact_handler.py"
+  }
+
+  source {
+    content  = file("${path.module}/../lambda/sns_batch.py")
+    filename = "sns_batch.py"
+  }
 }
 
 # API Gateway
@@ -1,54 +1,105 @@
 import json
 import boto3
 import logging
-import uuid
-from datetime import datetime
+import secrets
+import time
+from datetime import datetime, timezone
+from boto3.dynamodb.types import TypeSerializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from sns_batch import publish_batch
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Shared client configuration: larger connection pool for concurrent calls,
+# TCP keep-alive so warm invocations reuse HTTPS connections, adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+dynamodb = boto3.client('dynamodb', config=BOTO_CONFIG)
+serialize = TypeSerializer().serialize
+sns = boto3.client('sns', config=BOTO_CONFIG)
 
 # Get table and topic from environment variables
 CONTACT_TABLE = 'contact-submissions'
 SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:contact-notifications'  # This will be updated by Terraform
 
+# DynamoDB BatchWriteItem accepts at most 25 put requests per call
+DYNAMODB_BATCH_SIZE = 25
+DYNAMODB_BATCH_MAX_ATTEMPTS = 5
+
+def json_dumps(obj, default=None):
+    """Serialize to a JSON string, using orjson when it is available"""
+    if orjson:
+        return orjson.dumps(obj, default=default).decode()
+    return json.dumps(obj, default=default)
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when it is available"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class LazyJson:
+    """Defer JSON serialization of a log argument until the record is emitted"""
+    
+    def __init__(self, obj):
+        self.obj = obj
+    
+    def __str__(self):
+        return json_dumps(self.obj, default=str)
+
 def lambda_handler(event, context):
     """
     BROKEN Lambda function to handle contact form submissions
     This function has intentional issues for debugging practice
     """
-    logger.info(f"Received event: {json.dumps(event)}")
+    logger.info("Received event: %s", LazyJson(event))
+    
+    # One wall-clock timestamp for the whole request
+    now_iso = datetime.now(timezone.utc).isoformat()
     
     try:
+        # Submissions delivered in batches (e.g. through SQS)
+        records = event.get('Records')
+        if records:
+            return process_submission_batch(records, now_iso)
+        
         # ISSUE 1: Incorrect body parsing - might cause errors
         body = event.get('body', {})
         if isinstance(body, str):
             # This might fail if the JSON is malformed
-            body = json.loads(body)
+            body = json_loads(body)
         
-        logger.info(f"Parsed body: {json.dumps(body)}")
+        logger.info("Parsed body: %s", LazyJson(body))
         
         # ISSUE 2: Missing validation - allows invalid data through
         # validate_form_data(body)  # This line is commented out!
         
         # ISSUE 3: Hardcoded values that might not exist
-        submission_id = process_contact_submission(body)
+        submission_id = process_contact_submission(body, now_iso)
         
         # ISSUE 4: Notification might fail due to wrong topic ARN
-        send_notification_email(body, submission_id)
+        send_notification_email(body, submission_id, now_iso)
         
         # ISSUE 5: Missing CORS headers in response
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': json_dumps({
                 'message': 'Contact form submitted successfully',
                 'submission_id': submission_id,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': now_iso
             })
         }
         
@@ -57,12 +108,31 @@ def lambda_handler(event, context):
         # ISSUE 6: Generic error response without proper CORS headers
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': json_dumps({
                 'error': 'Internal server error',
                 'message': 'An error occurred while processing your request'
             })
         }
 
+def process_submission_batch(records, now_iso):
+    """
+    Store a batch of contact submissions and notify about them with SNS PublishBatch
+    """
+    bodies = [json_loads(record['body']) for record in records]
+    submission_ids = store_contact_submissions(bodies, now_iso)
+    submissions = list(zip(bodies, submission_ids))
+    
+    send_notification_batch(submissions, now_iso)
+    
+    return {
+        'statusCode': 200,
+        'body': json_dumps({
+            'message': 'Contact forms submitted successfully',
+            'submission_ids': submission_ids,
+            'timestamp': now_iso
+        })
+    }
+
 def validate_form_data(data):
     """
     Validate the form data - This function exists but is not called
@@ -90,33 +160,37 @@ def validate_form_data(data):
         'errors': errors
     }
 
-def process_contact_submission(data):
+def build_submission_item(data, now):
+    """
+    Build the DynamoDB item for a contact submission
+    """
+    # ISSUE 7: Missing error handling for required fields
+    return {
+        'submission_id': secrets.token_hex(16),
+        'name': data['name'],  # This will fail if 'name' is not in data
+        'email': data['email'],  # This will fail if 'email' is not in data
+        'phone': data.get('phone', ''),
+        'subject': data['subject'],  # This will fail if 'subject' is not in data
+        'message': data['message'],  # This will fail if 'message' is not in data
+        'priority': data.get('priority', 'medium'),
+        'status': 'new',
+        'created_at': now,
+        'updated_at': now
+    }
+
+def process_contact_submission(data, now_iso):
     """
     Store the contact submission in DynamoDB - Has potential issues
     """
     try:
-        # Generate unique submission ID
-        submission_id = str(uuid.uuid4())
-        
-        # ISSUE 7: Missing error handling for required fields
-        item = {
-            'submission_id': submission_id,
-            'name': data['name'],  # This will fail if 'name' is not in data
-            'email': data['email'],  # This will fail if 'email' is not in data
-            'phone': data.get('phone', ''),
-            'subject': data['subject'],  # This will fail if 'subject' is not in data
-            'message': data['message'],  # This will fail if 'message' is not in data
-            'priority': data.get('priority', 'medium'),
-            'status': 'new',
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
+        # Build the item with a unique submission ID
+        item = build_submission_item(data, now_iso)
+        submission_id = item['submission_id']
         
-        logger.info(f"Storing item in DynamoDB: {json.dumps(item)}")
+        logger.info("Storing item in DynamoDB: %s", LazyJson(item))
         
         # ISSUE 8: Table name might not exist or have wrong permissions
-        table = dynamodb.Table(CONTACT_TABLE)
-        table.put_item(Item=item)
+        dynamodb.put_item(TableName=CONTACT_TABLE, Item=to_attribute_values(item))
         
         logger.info(f"Successfully stored submission {submission_id}")
         return submission_id
@@ -131,32 +205,81 @@ def process_contact_submission(data):
         logger.error(f"Error processing submission: {str(e)}")
         raise
 
-def send_notification_email(data, submission_id):
+def to_attribute_values(item):
     """
-    Send notification email via SNS - Has potential issues
+    Marshal an item into DynamoDB attribute values, emitting strings directly
     """
-    try:
-        # ISSUE 9: SNS topic ARN might be incorrect
-        message = f"""
-New Contact Form Submission
+    return {
+        key: {'S': value} if isinstance(value, str) else serialize(value)
+        for key, value in item.items()
+    }
 
-Submission ID: {submission_id}
-Name: {data.get('name', 'N/A')}
-Email: {data.get('email', 'N/A')}
-Phone: {data.get('phone', 'N/A')}
-Subject: {data.get('subject', 'N/A')}
-Priority: {data.get('priority', 'medium')}
+def store_contact_submissions(submissions, now):
+    """
+    Store several contact submissions in DynamoDB with BatchWriteItem, 25 items
+    per request, resending any unprocessed items with exponential backoff
+    """
+    try:
+        items = [build_submission_item(data, now) for data in submissions]
+        
+        for start in range(0, len(items), DYNAMODB_BATCH_SIZE):
+            request_items = {
+                CONTACT_TABLE: [
+                    {'PutRequest': {'Item': to_attribute_values(item)}}
+                    for item in items[start:start + DYNAMODB_BATCH_SIZE]
+                ]
+            }
+            
+            for attempt in range(DYNAMODB_BATCH_MAX_ATTEMPTS):
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+                
+                time.sleep(0.1 * 2 ** attempt)
+            
+            if request_items:
+                raise Exception(f"Unprocessed items remain after {DYNAMODB_BATCH_MAX_ATTEMPTS} attempts")
+        
+        logger.info(f"Successfully stored {len(items)} submissions")
+        return [item['submission_id'] for item in items]
+        
+    except ClientError as e:
+        logger.error(f"DynamoDB error: {str(e)}")
+        raise Exception(f"Failed to store contact submissions: {str(e)}")
+    except KeyError as e:
+        logger.error(f"Missing required field: {str(e)}")
+        raise Exception(f"Missing required field: {str(e)}")
 
-Message:
-{data.get('message', 'N/A')}
+def build_notification_email(data, submission_id, submitted_at):
+    """
+    Build the SNS subject and structured JSON message for a contact submission
+    """
+    message = json_dumps({
+        'submission_id': submission_id,
+        'name': data.get('name', 'N/A'),
+        'email': data.get('email', 'N/A'),
+        'phone': data.get('phone', 'N/A'),
+        'subject': data.get('subject', 'N/A'),
+        'priority': data.get('priority', 'medium'),
+        'message': data.get('message', 'N/A'),
+        'submitted_at': submitted_at
+    })
+    
+    return f"New Contact Form Submission - {data.get('subject', 'Unknown')}", message
 
-Submitted at: {datetime.utcnow().isoformat()}
-        """
+def send_notification_email(data, submission_id, submitted_at):
+    """
+    Send notification email via SNS - Has potential issues
+    """
+    try:
+        # ISSUE 9: SNS topic ARN might be incorrect
+        subject, message = build_notification_email(data, submission_id, submitted_at)
         
         # ISSUE 10: SNS publish might fail due to permissions or topic not existing
         response = sns.publish(
             TopicArn=SNS_TOPIC_ARN,
-            Subject=f"New Contact Form Submission - {data.get('subject', 'Unknown')}",
+            Subject=subject,
             Message=message
         )
         
@@ -171,6 +294,19 @@ Submitted at: {datetime.utcnow().isoformat()}
         # ISSUE 12: Not raising exception - email failure is silent
         pass
 
+def send_notification_batch(submissions, submitted_at):
+    """
+    Send notification emails for several submissions, 10 per SNS PublishBatch call,
+    retrying only the entries SNS reports as failed
+    """
+    entries = []
+    for i, (data, submission_id) in enumerate(submissions):
+        subject, message = build_notification_email(data, submission_id, submitted_at)
+        entries.append({'Id': str(i), 'Subject': subject, 'Message': message})
+    
+    sent = publish_batch(sns, SNS_TOPIC_ARN, entries)
+    logger.info(f"Notifications sent for {sent} of {len(entries)} submissions")
+
 def create_response(status_code, body):
     """
     Create HTTP response - This function exists but is not used
@@ -183,5 +319,5 @@ def create_response(status_code, body):
             'Access-Control-Allow-Methods': 'POST, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type, X-Amz-Date, Authorization, X-Api-Key, X-Amz-Security-Token'
         },
-        'body': json.dumps(body)
+        'body': json_dumps(body)
     }
@@ -1,36 +1,105 @@
+import os
 import json
 import boto3
 import logging
-import uuid
+import re
+import secrets
+import time
 from datetime import datetime
+from boto3.dynamodb.types import TypeSerializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from sns_batch import publish_batch
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
 # Configure logging
-logger = logging.getLogger()
+logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+# Shared client configuration: larger connection pool for concurrent calls,
+# TCP keep-alive so warm invocations reuse HTTPS connections, adaptive retries
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
+# Initialize AWS clients. The low-level DynamoDB client avoids loading the
+# resource model on cold start; items are marshalled explicitly instead.
+dynamodb = boto3.client('dynamodb', config=BOTO_CONFIG)
+serialize = TypeSerializer().serialize
+sns = boto3.client('sns', config=BOTO_CONFIG)
 
 # Get table and topic from environment variables
-CONTACT_TABLE = 'contact-submissions'
-SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:contact-notifications'  # This will be updated by Terraform
+CONTACT_TABLE = os.environ['CONTACT_TABLE']
+SNS_TOPIC_ARN = os.environ['SNS_TOPIC_ARN']
+
+# Form validation rules, compiled once per container
+REQUIRED_FIELDS = ('name', 'email', 'subject', 'message')
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+PHONE_PATTERN = re.compile(r'[\d\-() ]+')
+VALID_FORM = {'valid': True, 'errors': ()}
+
+# Notification email layout, filled in per submission
+NOTIFICATION_SUBJECT_TEMPLATE = "New Contact Form Submission - {subject}"
+NOTIFICATION_TEMPLATE = (
+    "New Contact Form Submission\n"
+    "\n"
+    "Submission ID: {submission_id}\n"
+    "Name: {name}\n"
+    "Email: {email}\n"
+    "Phone: {phone}\n"
+    "Subject: {subject}\n"
+    "Priority: {priority}\n"
+    "\n"
+    "Message:\n"
+    "{message}\n"
+    "\n"
+    "Submitted at: {submitted_at}\n"
+)
+
+# DynamoDB BatchWriteItem accepts at most 25 put requests per call
+DYNAMODB_BATCH_SIZE = 25
+DYNAMODB_BATCH_MAX_ATTEMPTS = 5
+
+def json_dumps(obj):
+    """Serialize to a JSON string, using orjson when it is available"""
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when it is available"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
 
 def lambda_handler(event, context):
     """
     Lambda function to handle contact form submissions
     """
-    logger.info(f"Received event: {json.dumps(event)}")
+    logger.debug("Received event: %s", event)
+    
+    # One timestamp for the whole request
+    now_iso = datetime.utcnow().isoformat()
     
     try:
+        # Submissions delivered in batches (e.g. through SQS)
+        records = event.get('Records')
+        if records:
+            return process_submission_batch(records, now_iso)
+        
         # Parse the request body
         if isinstance(event.get('body'), str):
-            body = json.loads(event['body'])
+            body = json_loads(event['body'])
         else:
             body = event.get('body', {})
         
-        logger.info(f"Parsed body: {json.dumps(body)}")
+        logger.debug("Parsed body: %s", body)
         
         # Validate required fields
         validation_result = validate_form_data(body)
@@ -41,15 +110,15 @@ def lambda_handler(event, context):
             })
         
         # Process the contact form submission
-        submission_id = process_contact_submission(body)
+        submission_id = process_contact_submission(body, now_iso)
         
         # Send notification email
-        send_notification_email(body, submission_id)
+        send_notification_email(body, submission_id, now_iso)
         
         return create_response(200, {
             'message': 'Contact form submitted successfully',
             'submission_id': submission_id,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': now_iso
         })
         
     except Exception as e:
@@ -59,31 +128,69 @@ def lambda_handler(event, context):
             'message': 'An error occurred while processing your request'
         })
 
+def process_submission_batch(records, now_iso):
+    """
+    Validate and store a batch of contact submissions
+    """
+    items = []
+    submissions = []
+    for record in records:
+        # A malformed record is rejected on its own without failing the batch
+        try:
+            body = json_loads(record['body'])
+            validation_result = validate_form_data(body)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable submission {record.get('messageId')}: {str(e)}")
+            continue
+        
+        if not validation_result['valid']:
+            logger.warning(f"Skipping invalid submission {record.get('messageId')}: {validation_result['errors']}")
+            continue
+        
+        item = build_submission_item(body, now_iso)
+        items.append(item)
+        submissions.append((body, item['submission_id']))
+    
+    process_contact_batch(items)
+    
+    # Notifications are built from the submitted bodies, as in the single-record path
+    send_notification_batch(submissions, now_iso)
+    
+    return create_response(200, {
+        'message': 'Contact forms submitted successfully',
+        'submission_ids': [item['submission_id'] for item in items],
+        'rejected': len(records) - len(items),
+        'timestamp': now_iso
+    })
+
 def validate_form_data(data):
     """
     Validate the form data
     """
-    errors = []
+    email = data.get('email', '')
+    message = data.get('message', '')
+    phone = data.get('phone', '')
+    
+    # Fast path for well-formed submissions, without building an error list
+    if (all(data.get(field) for field in REQUIRED_FIELDS)
+            and EMAIL_PATTERN.fullmatch(email)
+            and len(message) >= 10
+            and (not phone or PHONE_PATTERN.fullmatch(phone))):
+        return VALID_FORM
     
     # Required fields
-    required_fields = ['name', 'email', 'subject', 'message']
-    for field in required_fields:
-        if not data.get(field):
-            errors.append(f'{field} is required')
+    errors = [f'{field} is required' for field in REQUIRED_FIELDS if not data.get(field)]
     
     # Email validation
-    email = data.get('email', '')
-    if email and '@' not in email:
+    if email and not EMAIL_PATTERN.fullmatch(email):
         errors.append('Invalid email format')
     
     # Message length validation
-    message = data.get('message', '')
     if message and len(message) < 10:
         errors.append('Message must be at least 10 characters long')
     
     # Phone validation (if provided)
-    phone = data.get('phone', '')
-    if phone and not phone.replace('-', '').replace('(', '').replace(')', '').replace(' ', '').isdigit():
+    if phone and not PHONE_PATTERN.fullmatch(phone):
         errors.append('Invalid phone number format')
     
     return {
@@ -91,33 +198,36 @@ def validate_form_data(data):
         'errors': errors
     }
 
-def process_contact_submission(data):
+def build_submission_item(data, now):
+    """
+    Prepare the DynamoDB item for a contact submission
+    """
+    return {
+        'submission_id': secrets.token_hex(16),
+        'name': data['name'],
+        'email': data['email'],
+        'phone': data.get('phone', ''),
+        'subject': data['subject'],
+        'message': data['message'],
+        'priority': data.get('priority', 'medium'),
+        'status': 'new',
+        'created_at': now,
+        'updated_at': now
+    }
+
+def process_contact_submission(data, now_iso):
     """
     Store the contact submission in DynamoDB
     """
     try:
-        # Generate unique submission ID
-        submission_id = str(uuid.uuid4())
+        # Prepare the item for DynamoDB with a unique submission ID
+        item = build_submission_item(data, now_iso)
+        submission_id = item['submission_id']
         
-        # Prepare the item for DynamoDB
-        item = {
-            'submission_id': submission_id,
-            'name': data['name'],
-            'email': data['email'],
-            'phone': data.get('phone', ''),
-            'subject': data['subject'],
-            'message': data['message'],
-            'priority': data.get('priority', 'medium'),
-            'status': 'new',
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
-        
-        logger.info(f"Storing item in DynamoDB: {json.dumps(item)}")
+        logger.debug("Storing item in DynamoDB: %s", item)
         
         # Store in DynamoDB
-        table = dynamodb.Table(CONTACT_TABLE)
-        table.put_item(Item=item)
+        dynamodb.put_item(TableName=CONTACT_TABLE, Item=to_attribute_values(item))
         
         logger.info(f"Successfully stored submission {submission_id}")
         return submission_id
@@ -129,32 +239,72 @@ def process_contact_submission(data):
         logger.error(f"Error processing submission: {str(e)}")
         raise
 
-def send_notification_email(data, submission_id):
+def to_attribute_values(item):
     """
-    Send notification email via SNS
+    Marshal an item into DynamoDB attribute values, emitting strings directly
     """
-    try:
-        # Prepare email message
-        message = f"""
-New Contact Form Submission
+    return {
+        key: {'S': value} if isinstance(value, str) else serialize(value)
+        for key, value in item.items()
+    }
 
-Submission ID: {submission_id}
-Name: {data['name']}
-Email: {data['email']}
-Phone: {data.get('phone', 'N/A')}
-Subject: {data['subject']}
-Priority: {data.get('priority', 'medium')}
+def process_contact_batch(items):
+    """
+    Store several contact submissions in DynamoDB with BatchWriteItem, 25 items
+    per request, resending any unprocessed items with exponential backoff
+    """
+    try:
+        for start in range(0, len(items), DYNAMODB_BATCH_SIZE):
+            request_items = {
+                CONTACT_TABLE: [
+                    {'PutRequest': {'Item': to_attribute_values(item)}}
+                    for item in items[start:start + DYNAMODB_BATCH_SIZE]
+                ]
+            }
+            
+            for attempt in range(DYNAMODB_BATCH_MAX_ATTEMPTS):
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+                
+                time.sleep(0.1 * 2 ** attempt)
+            
+            if request_items:
+                raise Exception(f"Unprocessed items remain after {DYNAMODB_BATCH_MAX_ATTEMPTS} attempts")
+        
+        logger.info(f"Successfully stored {len(items)} submissions")
+        
+    except ClientError as e:
+        logger.error(f"DynamoDB error: {str(e)}")
+        raise Exception(f"Failed to store contact submissions: {str(e)}")
 
-Message:
-{data['message']}
+def build_notification_email(data, submission_id, submitted_at):
+    """
+    Build the SNS subject and message for a contact submission
+    """
+    fields = {
+        **data,
+        'submission_id': submission_id,
+        'phone': data.get('phone', 'N/A'),
+        'priority': data.get('priority', 'medium'),
+        'submitted_at': submitted_at
+    }
+    
+    return NOTIFICATION_SUBJECT_TEMPLATE.format_map(fields), NOTIFICATION_TEMPLATE.format_map(fields)
 
-Submitted at: {datetime.utcnow().isoformat()}
-        """
+def send_notification_email(data, submission_id, submitted_at):
+    """
+    Send notification email via SNS
+    """
+    try:
+        # Prepare email message
+        subject, message = build_notification_email(data, submission_id, submitted_at)
         
         # Send notification
         response = sns.publish(
             TopicArn=SNS_TOPIC_ARN,
-            Subject=f"New Contact Form Submission - {data['subject']}",
+            Subject=subject,
             Message=message
         )
         
@@ -166,6 +316,19 @@ Submitted at: {datetime.utcnow().isoformat()}
     except Exception as e:
         logger.error(f"Error sending notification: {str(e)}")
 
+def send_notification_batch(submissions, submitted_at):
+    """
+    Send notification emails for several submissions, 10 per SNS PublishBatch call,
+    retrying only the entries SNS reports as failed
+    """
+    entries = []
+    for i, (data, submission_id) in enumerate(submissions):
+        subject, message = build_notification_email(data, submission_id, submitted_at)
+        entries.append({'Id': str(i), 'Subject': subject, 'Message': message})
+    
+    sent = publish_batch(sns, SNS_TOPIC_ARN, entries)
+    logger.info(f"Notifications sent for {sent} of {len(entries)} submissions")
+
 def create_response(status_code, body):
     """
     Create HTTP response with CORS headers
@@ -178,5 +341,5 @@ def create_response(status_code, body):
             'Access-Control-Allow-Methods': 'POST, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type, X-Amz-Date, Authorization, X-Api-Key, X-Amz-Security-Token'
         },
-        'body': json.dumps(body)
+        'body': json_dumps(body)
     }
@@ -0,0 +1,46 @@
+import logging
+import time
+from botocore.exceptions import ClientError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# SNS PublishBatch accepts at most 10 entries per request
+SNS_BATCH_SIZE = 10
+SNS_BATCH_MAX_ATTEMPTS = 3
+
+def publish_batch(sns, topic_arn, entries):
+    """
+    Publish entries to an SNS topic, 10 per PublishBatch call, retrying only the
+    entries SNS reports as failed, and return how many were sent
+    """
+    failed = 0
+    for start in range(0, len(entries), SNS_BATCH_SIZE):
+        pending = entries[start:start + SNS_BATCH_SIZE]
+        
+        attempts = 0
+        while pending and attempts < SNS_BATCH_MAX_ATTEMPTS:
+            # Back off before each retry, never after the last attempt
+            if attempts:
+                time.sleep(0.1 * 2 ** (attempts - 1))
+            attempts += 1
+            
+            try:
+                response = sns.publish_batch(
+                    TopicArn=topic_arn,
+                    PublishBatchRequestEntries=pending
+                )
+            except ClientError as e:
+                # Don't raise exception here - we don't want email failure to break the form submission
+                logger.error(f"SNS error: {str(e)}")
+                break
+            
+            failed_ids = {failure['Id'] for failure in response.get('Failed', [])}
+            pending = [entry for entry in pending if entry['Id'] in failed_ids]
+        
+        if pending:
+            logger.error(f"Failed to send {len(pending)} notifications after {attempts} attempts")
+            failed += len(pending)
+    
+    return len(entries) - failed